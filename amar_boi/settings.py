@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -100,6 +101,30 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache alias and lifetime (seconds) for cached catalog responses. The alias
+# also holds the version counters that invalidate them (and the book list
+# ETags), so in production point it at a shared backend (e.g. Redis): with
+# locmem a change only invalidates the process that made it, and the other
+# workers keep serving old stock and prices until their entries expire.
+STORE_CACHE_ALIAS = 'default'
+STORE_RESPONSE_CACHE_TIMEOUT = 300
+
+# Cart storage: 'store.carts.DatabaseCartBackend' or 'store.carts.CacheCartBackend'
+STORE_CART_BACKEND = 'store.carts.DatabaseCartBackend'
+STORE_CART_CACHE_ALIAS = 'default'
+STORE_CART_TTL = 60 * 60 * 24 * 7
+# Database carts older than this are deleted by `manage.py purge_carts`
+STORE_CART_RETENTION_DAYS = 30
+# Co-purchase tables written by `manage.py build_recommendations`
+STORE_RECOMMENDATIONS_DIR = BASE_DIR / 'recommendations'
+STORE_RECOMMENDATIONS_TOP_K = 20
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -155,10 +180,33 @@ REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
+    # Token buckets (core.throttling): '<throttle_scope>.<ip|username>': 'tokens/period'
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': '20/min',
+        'login.username': '5/min',
+        'register.ip': '10/hour',
+    },
+    # Proxies in front of the app that append to X-Forwarded-For. The login
+    # and register IP buckets only read that header once this is set; left
+    # as None they key on REMOTE_ADDR.
+    'NUM_PROXIES': None,
 }
 
+# Cache holding the throttle buckets; point it at a shared backend (e.g. Redis)
+# when running more than one process, locmem only limits each process.
+THROTTLE_CACHE_ALIAS = 'default'
+# Password hashes (login, registration) computed at once per process, and
+# how long a request waits for a free slot before getting a 429.
+PASSWORD_HASHING_CONCURRENCY = 4
+PASSWORD_HASHING_TIMEOUT = 0.5
+
+# Per-process cache of authenticated users and their customer ids
+# (core.authentication.CachedJWTAuthentication)
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+
 SIMPLE_JWT = {
    'AUTH_HEADER_TYPES': ('JWT',),
    "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -0,0 +1,127 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from core.tokens import CUSTOMER_ID_CLAIM
+from store.models import Customer
+
+
+class UserCache:
+    # Bounded LRU of user id -> (user, customer id) whose entries expire after
+    # `ttl` seconds. It lives in each process: saves and deletes clear the
+    # entry here (core.signals.handlers), other processes catch up within ttl.
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, value):
+        if not self.maxsize:
+            return
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(
+    getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+    getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # JWTAuthentication that keeps users and their customer ids in user_cache,
+    # so an authenticated request usually runs no auth queries at all. The
+    # customer id is left on request.customer_id.
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user, customer_id = self.get_user_and_customer_id(validated_token)
+        request.customer_id = customer_id
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        return self.get_user_and_customer_id(validated_token)[0]
+
+    def get_user_and_customer_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        # Tokens from core.tokens.CustomerRefreshToken name the customer; older
+        # ones have it joined in when the user is loaded.
+        claimed_customer_id = validated_token.get(CUSTOMER_ID_CLAIM)
+        entry = user_cache.get(user_id)
+        if entry is None:
+            queryset = self.user_model.objects.all()
+            if claimed_customer_id is None:
+                queryset = queryset.select_related('customer')
+            try:
+                user = queryset.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if claimed_customer_id is None:
+                customer = getattr(user, 'customer', None)
+                entry = (user, customer.id if customer else None)
+            else:
+                entry = (user, claimed_customer_id)
+            user_cache.set(user_id, entry)
+        user, customer_id = entry
+        if claimed_customer_id is not None:
+            customer_id = claimed_customer_id
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        # Each request gets its own copy; the cached instance is shared between threads.
+        return copy.copy(user), customer_id
+
+
+def get_customer_id(request):
+    # Id of the authenticated user's customer. CachedJWTAuthentication sets it
+    # up front; other authentication schemes look it up once per request.
+    customer_id = getattr(request, 'customer_id', None)
+    if customer_id is None:
+        customer_id = Customer.objects.values_list('id', flat=True).get(user_id=request.user.id)
+        request.customer_id = customer_id
+    return customer_id
@@ -0,0 +1,165 @@
+import os
+import time
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from core.models import User
+from store.importing import batched, iter_records
+from store.models import Customer
+
+
+MEMBERSHIPS = {code for code, label in Customer.MEMBERSHIP_CHOICES}
+
+
+class Command(BaseCommand):
+    help = (
+        'Import users from a CSV or JSONL file. Columns: username, email, password (plain text) or '
+        'password_hash (already hashed by Django), first_name, last_name, phone, birth_date, membership. '
+        'Users whose username or email already exists are skipped. Each user gets a Customer created in '
+        'the same batch, without the per-user post_save signal.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes hashing passwords; 0 hashes in this process.'
+        )
+
+    def handle(self, *args, **options):
+        self.totals = {'created': 0, 'skipped': 0}
+        self.errors = []
+        self.workers = options['workers']
+        executor = None
+        if self.workers:
+            # Spawned workers need Django set up before they can hash.
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+
+        try:
+            records = iter_records(options['path'], options['file_format'])
+            started = time.monotonic()
+            processed = 0
+            for batch in batched(records, options['batch_size']):
+                self.import_batch(batch, executor)
+                processed += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{processed} rows ({processed / elapsed:.0f} rows/s)')
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        for line_number, message in self.errors:
+            self.stderr.write(f'line {line_number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {self.totals['created']}, skipped {self.totals['skipped']}, "
+            f'failed {len(self.errors)} in {time.monotonic() - started:.1f}s.'
+        ))
+
+    def parse(self, record):
+        username = User.normalize_username((record.get('username') or '').strip())
+        if not username:
+            raise ValueError('username is required.')
+        if len(username) > 150:
+            raise ValueError('username must be at most 150 characters.')
+        email = User.objects.normalize_email((record.get('email') or '').strip())
+        if '@' not in email:
+            raise ValueError('a valid email is required.')
+        membership = (record.get('membership') or Customer.MEMBERSHIP_BRONZE).strip().upper()[:1]
+        if membership not in MEMBERSHIPS:
+            raise ValueError(f"membership must be one of {', '.join(sorted(MEMBERSHIPS))}.")
+        birth_date = (record.get('birth_date') or '').strip()
+        try:
+            birth_date = date.fromisoformat(birth_date) if birth_date else None
+        except ValueError:
+            raise ValueError('birth_date must be a YYYY-MM-DD date.')
+        return {
+            'username': username,
+            'email': email,
+            'password': record.get('password') or None,
+            'password_hash': record.get('password_hash') or None,
+            'first_name': (record.get('first_name') or '').strip()[:150],
+            'last_name': (record.get('last_name') or '').strip()[:150],
+            'phone': (record.get('phone') or '').strip()[:255],
+            'birth_date': birth_date,
+            'membership': membership,
+        }
+
+    def import_batch(self, batch, executor):
+        rows = {}
+        emails = set()
+        # Case-folded username / lowercased email -> line number. Keys that
+        # only differ in case would collide in a case-insensitive unique
+        # index (MySQL), so they count as the same user.
+        seen_usernames, seen_emails = {}, {}
+        for line_number, record, error in batch:
+            if error is None:
+                try:
+                    row = self.parse(record)
+                except ValueError as parse_error:
+                    error = str(parse_error)
+            if error is None:
+                username_key, email_key = row['username'].casefold(), row['email'].lower()
+                if username_key in seen_usernames:
+                    error = f'username repeats line {seen_usernames[username_key]}.'
+                elif email_key in seen_emails:
+                    error = f'email repeats line {seen_emails[email_key]}.'
+            if error is not None:
+                self.errors.append((line_number, error))
+                continue
+            seen_usernames[username_key] = seen_emails[email_key] = line_number
+            rows[row['username']] = row
+            emails.add(row['email'])
+        if not rows:
+            return
+
+        existing = User.objects.filter(Q(username__in=rows) | Q(email__in=emails)).values_list('username', 'email')
+        taken_usernames, taken_emails = set(), set()
+        for username, email in existing:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+        new_rows = [
+            row for row in rows.values()
+            if row['username'] not in taken_usernames and row['email'] not in taken_emails
+        ]
+        self.totals['skipped'] += len(rows) - len(new_rows)
+        rows = new_rows
+        if not rows:
+            return
+
+        # Hashing is what makes importing users slow; do it across processes.
+        plain = [row['password'] for row in rows if not row['password_hash']]
+        if executor is None:
+            hashes = iter(map(make_password, plain))
+        else:
+            hashes = executor.map(make_password, plain, chunksize=max(1, len(plain) // (self.workers * 4)))
+        users = [
+            User(
+                username=row['username'],
+                email=row['email'],
+                password=row['password_hash'] or next(hashes),
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+            ) for row in rows
+        ]
+
+        # bulk_create skips post_save, so create_customer_for_new_user does not
+        # run: the customers are created here, in the same transaction.
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+                for user in users:
+                    user.id = ids[user.username]
+            Customer.objects.bulk_create([
+                Customer(user_id=user.id, phone=row['phone'], birth_date=row['birth_date'], membership=row['membership'])
+                for user, row in zip(users, rows)
+            ])
+        self.totals['created'] += len(users)
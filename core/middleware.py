@@ -0,0 +1,93 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_budget(view_class, action, initkwargs=None):
+    # query_budget on a viewset is either one number for every action or a
+    # dict of {action: number}; @action(query_budget=...) overrides both.
+    budget = (initkwargs or {}).get('query_budget', getattr(view_class, 'query_budget', None))
+    if isinstance(budget, dict):
+        return budget.get(action)
+    return budget
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+    @contextmanager
+    def installed(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+class QueryBudgetMiddleware:
+    # Counts the queries and DB time of every request, reports them in a
+    # Server-Timing header and logs a warning when a viewset action goes over
+    # its declared query_budget. The numbers are also left on
+    # response.query_stats for core.testing.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request.query_budget_view = None
+        started = time.perf_counter()
+        with counter.installed():
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        stats = {'queries': counter.count, 'db_time': counter.duration, 'view': None, 'action': None, 'budget': None}
+        if request.query_budget_view is not None:
+            view_class, action, initkwargs = request.query_budget_view
+            stats.update(view=view_class, action=action, budget=get_query_budget(view_class, action, initkwargs))
+        response.query_stats = stats
+        response['Server-Timing'] = (
+            f'db;desc="{counter.count} queries";dur={counter.duration * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        if response.streaming:
+            response.streaming_content = self.stream(request, response.streaming_content, counter, stats)
+        else:
+            self.check_budget(request, stats)
+        return response
+
+    def stream(self, request, content, counter, stats):
+        # Streamed bodies (exports) keep querying after the headers are sent;
+        # their queries are counted against the budget once the body is done.
+        with counter.installed():
+            yield from content
+        stats.update(queries=counter.count, db_time=counter.duration)
+        self.check_budget(request, stats)
+
+    def check_budget(self, request, stats):
+        if stats['budget'] is not None and stats['queries'] > stats['budget']:
+            logger.warning(
+                '%s %s (%s.%s) ran %d queries, over its budget of %d.',
+                request.method, request.path, stats['view'].__name__, stats['action'],
+                stats['queries'], stats['budget']
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            method = request.method.lower()
+            action = actions.get('get' if method == 'head' else method)
+            if action:
+                request.query_budget_view = (view_func.cls, action, view_func.initkwargs)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import User
+from .throttling import hashing_slot
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -7,6 +8,17 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields =  ['id', 'username', 'email', 'password',  'first_name', 'last_name', 'date_joined']
 
+    def create(self, validated_data):
+        with hashing_slot():
+            return User.objects.create_user(**validated_data)
+
+    def update(self, instance, validated_data):
+        password = validated_data.pop('password', None)
+        if password is not None:
+            with hashing_slot():
+                instance.set_password(password)
+        return super().update(instance, validated_data)
+
 class UserLoginSerializer(serializers.Serializer):
     username = serializers.CharField(max_length=150, required=True)
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})  
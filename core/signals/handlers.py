@@ -1,7 +1,21 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from core.authentication import user_cache
+from store.models import Customer
 from store.signals import order_created
 
 
 @receiver(order_created)
 def on_order_created(sender, **kwargs):
-    print(kwargs['order'])
\ No newline at end of file
+    print(kwargs['order'])
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, **kwargs):
+    user_cache.invalidate(kwargs['instance'].pk)
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def forget_cached_customer(sender, **kwargs):
+    user_cache.invalidate(kwargs['instance'].user_id)
@@ -0,0 +1,63 @@
+from django.urls import URLResolver, get_resolver
+from core.middleware import get_query_budget
+
+
+def get_viewset_actions(urlconf):
+    # (route, viewset class, action, initkwargs) for every reachable viewset action in urlconf.
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern))
+                continue
+            callback = pattern.callback
+            actions = getattr(callback, 'actions', {})
+            allowed = getattr(getattr(callback, 'cls', None), 'http_method_names', [])
+            for action in dict.fromkeys(action for method, action in actions.items() if method in allowed):
+                yield prefix + str(pattern.pattern), callback.cls, action, callback.initkwargs
+
+    seen = set()
+    for route, view_class, action, initkwargs in walk(get_resolver(urlconf).url_patterns, ''):
+        if (view_class, action) not in seen:
+            seen.add((view_class, action))
+            yield route, view_class, action, initkwargs
+
+
+class QueryBudgetTestMixin:
+    # For TestCases exercising routes through the test client with
+    # core.middleware.QueryBudgetMiddleware installed.
+    def setUp(self):
+        super().setUp()
+        self.exercised_actions = set()
+
+    def assertWithinQueryBudget(self, response):
+        if response.streaming:
+            # Streamed queries are only counted once the body is consumed.
+            b''.join(response.streaming_content)
+        stats = response.query_stats
+        name = f"{stats['view'].__name__}.{stats['action']}" if stats['view'] else 'This response'
+        self.assertIsNotNone(stats['budget'], f'{name} has no query_budget.')
+        self.assertLessEqual(
+            stats['queries'], stats['budget'],
+            f"{name} ran {stats['queries']} queries, over its budget of {stats['budget']}."
+        )
+        self.exercised_actions.add((stats['view'], stats['action']))
+        return response
+
+    def assertQueryBudgetsDeclared(self, *urlconfs):
+        missing = [
+            f'{route} ({view_class.__name__}.{action})'
+            for urlconf in urlconfs
+            for route, view_class, action, initkwargs in get_viewset_actions(urlconf)
+            if get_query_budget(view_class, action, initkwargs) is None
+        ]
+        self.assertEqual(missing, [], 'Routes without a query_budget.')
+
+    def assertAllRoutesExercised(self, *urlconfs, exclude=()):
+        missing = [
+            f'{route} ({view_class.__name__}.{action})'
+            for urlconf in urlconfs
+            for route, view_class, action, initkwargs in get_viewset_actions(urlconf)
+            if (view_class, action) not in self.exercised_actions
+            and f'{view_class.__name__}.{action}' not in exclude
+        ]
+        self.assertEqual(missing, [], 'Routes not checked against their query_budget.')
@@ -1,3 +1,174 @@
+import json
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core import throttling
+from core.authentication import user_cache
+from core.models import User
+from core.testing import QueryBudgetTestMixin
+from core.views import UserViewSet
 
 # Create your tests here.
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='s3cret-pass')
+        self.client = APIClient()
+
+    def request(self, method, path, data=None, status=200):
+        response = getattr(self.client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, status, response.data)
+        return self.assertWithinQueryBudget(response)
+
+    def test_budgets_are_declared(self):
+        self.assertQueryBudgetsDeclared('core.urls')
+
+    def test_all_routes_are_exercised(self):
+        data = {'username': 'writer', 'email': 'writer@example.com', 'password': 'an0ther-pass'}
+        pk = self.request('post', '/user/register/', data, status=201).data['id']
+        self.request('post', '/user/login/', {'username': 'reader', 'password': 's3cret-pass'})
+        self.client.force_authenticate(self.user)
+        self.request('get', '/users/')
+        self.request('get', f'/users/{pk}/')
+        self.request('put', f'/users/{pk}/', dict(data, first_name='Writer'))
+        self.request('patch', f'/users/{pk}/', {'last_name': 'Das'})
+        self.request('delete', f'/users/{pk}/', status=204)
+        self.assertAllRoutesExercised('core.urls')
+
+    def test_over_budget_is_reported(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(UserViewSet, 'query_budget', {'list': 0}):
+            with self.assertLogs('core.middleware', 'WARNING') as logs:
+                response = self.client.get('/users/')
+        self.assertIn('UserViewSet.list) ran 1 queries, over its budget of 0', logs.output[0])
+        self.assertRegex(response['Server-Timing'], r'^db;desc="1 queries";dur=[\d.]+, total;dur=[\d.]+$')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(username='reader', email='reader@example.com')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+
+    def get_orders(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/orders/')
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_user_and_customer_are_cached(self):
+        response, first = self.get_orders()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum('"core_user"' in sql for sql in first), 1)
+        self.assertFalse(any(sql.startswith('SELECT "store_customer"') for sql in first))
+
+        response, second = self.get_orders()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('"core_user"' in sql or '"store_customer"' in sql for sql in second), second)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_deactivation_invalidates_the_cache(self):
+        self.assertEqual(self.get_orders()[0].status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_orders()[0].status_code, 401)
+
+
+class LoginThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+
+    def login(self, username, password='wrong-pass', **extra):
+        return self.client.post('/user/login/', {'username': username, 'password': password}, **extra)
+
+    def test_registered_user_can_log_in(self):
+        data = {'username': 'writer', 'email': 'writer@example.com', 'password': 'an0ther-pass'}
+        self.assertEqual(self.client.post('/user/register/', data).status_code, 201)
+        self.assertNotEqual(User.objects.get().password, 'an0ther-pass')
+        self.assertIn('access', self.login('writer', 'an0ther-pass').data)
+
+    def test_username_bucket_runs_dry(self):
+        statuses = [self.login('Reader').status_code for _ in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+        response = self.login('reader ')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login('someone-else').status_code, 401)
+
+    def login_from(self, addresses):
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {'login.ip': '3/hour'}):
+            return [
+                self.login(f'user{index}', HTTP_X_FORWARDED_FOR=address).status_code
+                for index, address in enumerate(addresses)
+            ]
+
+    def test_spoofed_forwarded_for_shares_the_ip_bucket(self):
+        addresses = ['10.0.0.1', '10.0.0.2', '10.0.0.3, 10.0.0.4', '10.0.0.5']
+        self.assertEqual(self.login_from(addresses), [401] * 3 + [429])
+
+    def test_forwarded_for_behind_trusted_proxies(self):
+        with mock.patch.object(api_settings, 'NUM_PROXIES', 1):
+            self.assertEqual(self.login_from(['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4']), [401] * 4)
+            self.assertEqual(self.login_from(['10.0.0.9'] * 4), [401] * 3 + [429])
+
+    def test_busy_hashers_fail_fast(self):
+        with mock.patch.object(throttling, 'hashing_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            with self.settings(PASSWORD_HASHING_TIMEOUT=0.01):
+                response = self.login('reader')
+        self.assertEqual(response.status_code, 429)
+
+
+class ImportUsersTests(TestCase):
+    def import_users(self, *records):
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+            file.flush()
+            call_command('import_users', file.name, '--workers', '1', stdout=mock.Mock(), stderr=stderr)
+        return stderr.getvalue().splitlines()
+
+    def test_users_get_one_customer_each(self):
+        User.objects.create_user(username='taken', email='taken@example.com')
+        self.import_users(
+            {'username': 'ana', 'email': 'ana@example.com', 'password': 's3cret-pass', 'membership': 'g'},
+            {'username': 'ben', 'email': 'ben@example.com', 'phone': '017', 'birth_date': '1990-05-01'},
+            {'username': 'taken', 'email': 'other@example.com'},
+            {'username': 'ana', 'email': 'ana2@example.com'},
+            {'username': 'bad', 'email': 'bad@example.com', 'birth_date': 'soon'},
+        )
+
+        self.assertEqual(
+            sorted(User.objects.values_list('username', 'customer__membership', 'customer__phone')),
+            [('ana', 'G', ''), ('ben', 'B', '017'), ('taken', 'B', '')]
+        )
+        self.assertEqual(authenticate(username='ana', password='s3cret-pass').username, 'ana')
+        self.assertFalse(User.objects.get(username='ben').has_usable_password())
+
+    def test_keys_differing_only_in_case_collide(self):
+        errors = self.import_users(
+            {'username': 'ana', 'email': 'ana@example.com'},
+            {'username': 'Ana', 'email': 'other@example.com'},
+            {'username': 'ben', 'email': 'ANA@example.com'},
+            {'username': 'ANA', 'email': 'ana3@example.com'},
+        )
+        self.assertEqual(errors, [
+            'line 2: username repeats line 1.',
+            'line 3: email repeats line 1.',
+            'line 4: username repeats line 1.',
+        ])
+        self.assertEqual(list(User.objects.values_list('username', 'email')), [('ana', 'ana@example.com')])
@@ -0,0 +1,99 @@
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Token bucket per (scope, kind, ident). The view's `throttle_scope` and the
+    # class's `kind` pick the rate in DEFAULT_THROTTLE_RATES, e.g.
+    # 'login.ip': '20/min' allows bursts of 20 and refills 20 tokens a minute.
+    # Buckets live in the THROTTLE_CACHE_ALIAS cache; use a shared backend
+    # there so every worker sees the same buckets. Like DRF's own throttles
+    # the read-modify-write is not atomic, so a burst may slip a few extra
+    # requests through.
+    kind = None
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_ident_for(self, request):
+        raise NotImplementedError('.get_ident_for() must be overridden')
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return None
+        return api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{self.kind}')
+
+    def parse_rate(self, rate):
+        # '20/min' -> (20 tokens, 20/60 tokens per second)
+        count, period = rate.split('/')
+        return int(count), int(count) / self.durations[period[0]]
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        ident = self.get_ident_for(request)
+        if rate is None or not ident:
+            return True
+        capacity, refill = self.parse_rate(rate)
+
+        cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+        key = f'throttle:{view.throttle_scope}:{self.kind}:{ident}'
+        now = time.time()
+        tokens, updated_at = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.wait_seconds = (1 - tokens) / refill
+        # Kept until the bucket would be full again.
+        cache.set(key, (tokens, now), timeout=int((capacity - tokens) / refill) + 1)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_ident_for(self, request):
+        # X-Forwarded-For is whatever the client sent unless NUM_PROXIES says
+        # how many trusted proxies append to it, so without it use the socket
+        # address.
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
+
+
+class UsernameTokenBucketThrottle(TokenBucketThrottle):
+    # Limits attempts against one account whatever address they come from.
+    kind = 'username'
+
+    def get_ident_for(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str):
+            return None
+        return username.strip().lower()[:150]
+
+
+hashing_slots = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_HASHING_CONCURRENCY', 4))
+
+
+@contextmanager
+def hashing_slot():
+    # Bounds how many password hashes this process computes at once. A login
+    # storm then gets quick 429s instead of tying up every worker thread.
+    if not hashing_slots.acquire(timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 0.5)):
+        raise Throttled(wait=1, detail='Too many sign-in attempts in progress, try again shortly.')
+    try:
+        yield
+    finally:
+        hashing_slots.release()
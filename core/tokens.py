@@ -0,0 +1,18 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+from store.models import Customer
+
+
+CUSTOMER_ID_CLAIM = 'customer_id'
+
+
+class CustomerRefreshToken(RefreshToken):
+    # Refresh token carrying the user's customer id; the access tokens made
+    # from it copy the claim, so store views can scope by customer without a
+    # lookup (core.authentication.CachedJWTAuthentication).
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        customer_id = Customer.objects.filter(user_id=user.id).values_list('id', flat=True).first()
+        if customer_id is not None:
+            token[CUSTOMER_ID_CLAIM] = customer_id
+        return token
@@ -2,10 +2,11 @@ from rest_framework.response import Response
 from django.contrib.auth import authenticate
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.mixins import CreateModelMixin
 from .models import User
+from .tokens import CustomerRefreshToken
+from .throttling import IPTokenBucketThrottle, UsernameTokenBucketThrottle, hashing_slot
 from .serializers import(
     UserSerializer,
     UserLoginSerializer
@@ -13,10 +14,17 @@ from .serializers import(
 
 
 
+# Rates for each throttle_scope are in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
 class UserRegisterViewSet(CreateModelMixin, GenericViewSet):
     serializer_class = UserSerializer
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'register'
+    query_budget = 4
 class UserLoginViewSet(CreateModelMixin, GenericViewSet):
     serializer_class = UserLoginSerializer
+    throttle_classes = [IPTokenBucketThrottle, UsernameTokenBucketThrottle]
+    throttle_scope = 'login'
+    query_budget = 2
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -25,13 +33,14 @@ class UserLoginViewSet(CreateModelMixin, GenericViewSet):
         username = serializer.validated_data.get('username')
         password = serializer.validated_data.get('password')
 
-        user = authenticate(username=username, password=password)
+        with hashing_slot():
+            user = authenticate(username=username, password=password)
 
         if not user:
             return Response({'error': 'Invalid Credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
         # If user is authenticated, generate JWT token
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomerRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -42,4 +51,6 @@ class UserViewSet(ModelViewSet):
     http_method_names = ['get', 'put', 'patch', 'delete']
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+    # JWT user lookup included (see core.middleware.QueryBudgetMiddleware).
+    query_budget = {'list': 2, 'retrieve': 2, 'update': 5, 'partial_update': 3, 'destroy': 9}
\ No newline at end of file
@@ -1,21 +1,22 @@
 from typing import Any
 from django.contrib import admin, messages
 from django.db.models.query import QuerySet
-from django.http import HttpRequest
-from django.db.models.aggregates import Count
 from django.utils.html import format_html, urlencode
 from django.urls import reverse
+from django.utils import timezone
 from .import models
+from .cache import bump_version
+from .counters import recount_for_books, update_order_totals
 
 # Register your models here.
 
 @admin.register(models.Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'books_count']
+    list_display = ['name', 'books', 'in_stock_books_count']
     search_fields = ['name']
 
-    @admin.display(ordering='books_count')
-    def books_count(self, category):
+    @admin.display(ordering='books_count', description='books count')
+    def books(self, category):
         url = (
             reverse('admin:store_book_changelist')
             + '?'
@@ -23,16 +24,11 @@ class CategoryAdmin(admin.ModelAdmin):
                 'category__id': str(category.id)
             }))
         return format_html('<a href="{}">{}</a>',url, category.books_count)
-    
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).annotate(
-            books_count=Count('books')
-        )
          
 
 @admin.register(models.Author)
 class AuthorAdmin(admin.ModelAdmin):
-    list_display = ['first_name', 'last_name', 'date_of_birth', 'nationality', 'is_alive']
+    list_display = ['first_name', 'last_name', 'date_of_birth', 'nationality', 'is_alive', 'books_count']
     list_per_page = 20
     list_filter = ['nationality']
     search_fields = ['first_name', 'last_name']
@@ -40,7 +36,7 @@ class AuthorAdmin(admin.ModelAdmin):
 
 @admin.register(models.Publication)
 class PublicationAdmin(admin.ModelAdmin):
-    list_display = ['name','address','website', 'email', 'phone_number','established_date']
+    list_display = ['name','address','website', 'email', 'phone_number','established_date', 'books_count']
     list_per_page = 20
     search_fields = ['name']
 
@@ -88,7 +84,9 @@ class BookAdmin(admin.ModelAdmin):
     
     @admin.action(description='Clear stock')
     def clear_stock(self, request, queryset:QuerySet):
-        updated_count = queryset.update(stock=0)
+        updated_count = queryset.update(stock=0, last_update=timezone.now())
+        recount_for_books(queryset)
+        bump_version(models.Book)
         self.message_user(
             request,
             f'{updated_count} books stock ware successfully updated.',
@@ -117,7 +115,27 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(models.Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'placed_at', 'customer', 'payment_status']
+    list_display = ['id', 'placed_at', 'customer', 'payment_status', 'total_amount', 'item_count']
     list_filter = ['payment_status']
+    readonly_fields = ['total_amount', 'item_count']
     inlines = [OrderItemInline]
-    list_per_page = 10
\ No newline at end of file
+    list_per_page = 10
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_order_totals(models.Order.objects.filter(pk=form.instance.pk))
+
+
+@admin.register(models.OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'topic', 'status', 'attempts', 'created_at', 'available_at', 'processed_at']
+    list_filter = ['status', 'topic']
+    readonly_fields = ['created_at']
+    ordering = ['-id']
+    list_per_page = 20
+    actions = ['retry']
+
+    @admin.action(description='Retry selected events')
+    def retry(self, request, queryset):
+        updated = queryset.update(status=models.OutboxEvent.STATUS_PENDING, available_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{updated} events were queued again.')
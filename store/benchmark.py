@@ -0,0 +1,203 @@
+import math
+import platform
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import django
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from core.tokens import CustomerRefreshToken
+from store.carts import get_cart_backend
+from store.models import Book, Cart, Category
+from store.search import tokenize
+
+
+# name -> default weight in the request mix
+DEFAULT_MIX = {
+    'books_list': 25,
+    'books_search': 20,
+    'book_detail': 15,
+    'categories': 10,
+    'cart_detail': 15,
+    'checkout': 10,
+    'orders_list': 5,
+}
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value):
+    # "books_search=50,checkout=10" -> {'books_search': 50, 'checkout': 10}
+    mix = {}
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint {name!r}; choose from {', '.join(DEFAULT_MIX)}.")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'Invalid weight for {name}: {weight!r}.')
+    if not mix or not any(mix.values()):
+        raise ValueError('The mix needs at least one endpoint with a positive weight.')
+    return mix
+
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Workload:
+    # Everything a run needs, prepared up front so the measured phase only
+    # issues requests: the request plan, auth tokens, search words, catalog
+    # and cart ids, and one ready-made cart per planned checkout.
+    def __init__(self, mix, requests, seed, users=20):
+        self.rng = random.Random(seed)
+        names = list(mix)
+        self.plan = self.rng.choices(names, weights=[mix[name] for name in names], k=requests)
+
+        User = get_user_model()
+        buyers = list(User.objects.filter(customer__isnull=False, is_staff=False).order_by('id')[:users])
+        if not buyers:
+            raise ValueError('The database has no customers; seed it first (manage.py seed_scale).')
+        self.tokens = [f'JWT {CustomerRefreshToken.for_user(user).access_token}' for user in buyers]
+
+        self.book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:5000])
+        if not self.book_ids:
+            raise ValueError('The database has no books; seed it first (manage.py seed_scale).')
+        self.category_ids = list(Category.objects.values_list('id', flat=True))
+        titles = Book.objects.order_by('id').values_list('title', flat=True)[:1000]
+        self.words = sorted({token for title in titles for token in tokenize(title)}) or ['book']
+
+        carts = get_cart_backend()
+        self.cart_ids = list(Cart.objects.order_by('created_at').values_list('id', flat=True)[:1000])
+        if not self.cart_ids or not carts.cart_exists(self.cart_ids[0]):
+            # No seeded carts, or a backend that does not keep them in
+            # store_cart (CacheCartBackend): fill a pool through the backend.
+            self.cart_ids = []
+            for _ in range(100):
+                cart = carts.create_cart()
+                books = self.rng.sample(self.book_ids, min(len(self.book_ids), self.rng.randint(0, 5)))
+                carts.add_items(cart.id, {book_id: self.rng.randint(1, 3) for book_id in books})
+                self.cart_ids.append(cart.id)
+        in_stock = list(Book.objects.filter(stock__gte=100).order_by('id').values_list('id', flat=True)[:5000])
+        self.checkout_carts = []
+        for _ in range(self.plan.count('checkout')):
+            cart = carts.create_cart()
+            books = self.rng.sample(in_stock, min(len(in_stock), self.rng.randint(1, 5)))
+            carts.add_items(cart.id, {book_id: 1 for book_id in books})
+            self.checkout_carts.append(str(cart.id))
+        self.lock = threading.Lock()
+
+    def build(self, name, rng):
+        # (method, path, data, extra headers) for one request of the given endpoint.
+        token = {'HTTP_AUTHORIZATION': rng.choice(self.tokens)}
+        if name == 'books_list':
+            return 'get', '/books/', None, {}
+        if name == 'books_search':
+            return 'get', '/books/', {'search': rng.choice(self.words)}, {}
+        if name == 'book_detail':
+            return 'get', f'/books/{rng.choice(self.book_ids)}/', None, {}
+        if name == 'categories':
+            return 'get', '/categories/', None, {}
+        if name == 'cart_detail':
+            return 'get', f'/carts/{rng.choice(self.cart_ids)}/', None, {}
+        if name == 'checkout':
+            with self.lock:
+                cart_id = self.checkout_carts.pop()
+            return 'post', '/orders/', {'cart_id': cart_id}, token
+        if name == 'orders_list':
+            return 'get', '/orders/', None, token
+        raise ValueError(name)
+
+
+def run(workload, concurrency, seed, warmup=0):
+    samples = defaultdict(list)
+    statuses = defaultdict(Counter)
+    queries = defaultdict(list)
+    queue = iter(enumerate(workload.plan))
+    queue_lock = threading.Lock()
+
+    def worker(index):
+        client = Client(raise_request_exception=False)
+        rng = random.Random(seed * 1000 + index)
+        try:
+            while True:
+                with queue_lock:
+                    position, name = next(queue, (None, None))
+                if name is None:
+                    return
+                method, path, data, headers = workload.build(name, rng)
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data, **headers)
+                elapsed = time.perf_counter() - started
+                if position < warmup:
+                    continue
+                samples[name].append(elapsed)
+                statuses[name][response.status_code] += 1
+                stats = getattr(response, 'query_stats', None)
+                if stats is not None:
+                    queries[name].append(stats['queries'])
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    duration = time.perf_counter() - started
+
+    endpoints = {}
+    for name in sorted(samples):
+        latencies = sorted(samples[name])
+        endpoints[name] = {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses[name].items() if status >= 400),
+            'status_codes': {str(status): count for status, count in sorted(statuses[name].items())},
+            'throughput': len(latencies) / duration,
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            **{f'p{percent}_ms': percentile(latencies, percent) * 1000 for percent in PERCENTILES},
+            'queries_avg': sum(queries[name]) / len(queries[name]) if queries[name] else None,
+            'queries_max': max(queries[name]) if queries[name] else None,
+        }
+    measured = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'concurrency': concurrency,
+            'seed': seed,
+            'warmup': warmup,
+        },
+        'total': {'requests': measured, 'duration_s': duration, 'throughput': measured / duration},
+        'endpoints': endpoints,
+    }
+
+
+def compare(baseline, current, threshold):
+    # Rows of (endpoint, metric, baseline, current, change %, regressed);
+    # latency regresses when it grows, throughput when it drops, by more than threshold %.
+    rows = []
+    for name, now in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        for metric, higher_is_worse in (('p50_ms', True), ('p95_ms', True), ('p99_ms', True), ('throughput', False)):
+            if not before.get(metric):
+                continue
+            change = (now[metric] - before[metric]) / before[metric] * 100
+            regressed = change > threshold if higher_is_worse else -change > threshold
+            rows.append((name, metric, before[metric], now[metric], change, regressed))
+        if before.get('queries_max') is not None and now.get('queries_max') is not None:
+            rows.append((
+                name, 'queries_max', before['queries_max'], now['queries_max'],
+                (now['queries_max'] - before['queries_max']) / max(before['queries_max'], 1) * 100,
+                now['queries_max'] > before['queries_max']
+            ))
+    return rows
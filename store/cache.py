@@ -0,0 +1,63 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+
+VERSION_KEY = 'store:version:{}'
+STATS_KEY = 'store:response-cache:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_CACHE_ALIAS', 'default')]
+
+
+def get_versions(*models):
+    cache = get_cache()
+    keys = [VERSION_KEY.format(model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed evicted/missing counters from the clock so they never
+            # fall back to a value an older cache entry was keyed with.
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(*models):
+    cache = get_cache()
+    for model in models:
+        key = VERSION_KEY.format(model._meta.label_lower)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def get_response_cache_key(prefix, request, kwargs, versions):
+    query = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+        if any(values)
+    )
+    raw = repr((request.get_host(), sorted(kwargs.items()), query, versions))
+    return f'store:response:{prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def record(outcome):
+    cache = get_cache()
+    key = STATS_KEY.format(outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    cache = get_cache()
+    return {
+        outcome: cache.get(STATS_KEY.format(outcome), 0)
+        for outcome in ('hits', 'misses')
+    }
@@ -0,0 +1,147 @@
+from uuid import UUID, uuid4
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from store.models import Book, Cart, CartItem
+from store.utils import set_prefetched
+
+
+def parse_cart_id(value):
+    try:
+        return value if isinstance(value, UUID) else UUID(str(value))
+    except ValueError:
+        return None
+
+
+class DatabaseCartBackend:
+    # Carts live in the store_cart / store_cartitem tables.
+    transactional = True
+
+    def create_cart(self):
+        return Cart.objects.create()
+
+    def get_cart(self, cart_id):
+        return Cart.objects.prefetch_related('items__book').filter(pk=cart_id).first()
+
+    def cart_exists(self, cart_id):
+        return Cart.objects.filter(pk=cart_id).exists()
+
+    def delete_cart(self, cart_id):
+        Cart.objects.filter(pk=cart_id).delete()
+
+    def get_items(self, cart_id):
+        return CartItem.objects.filter(cart_id=cart_id).select_related('book')
+
+    def get_item(self, cart_id, item_id):
+        try:
+            return self.get_items(cart_id).filter(pk=item_id).first()
+        except (TypeError, ValueError):
+            return None
+
+    def add_items(self, cart_id, quantities):
+        return CartItem.objects.add(cart_id, quantities)
+
+    def update_item(self, item, quantity):
+        item.quantity = quantity
+        item.save(update_fields=['quantity'])
+        return item
+
+    def delete_item(self, item):
+        item.delete()
+
+
+class CacheCartBackend:
+    # Carts live only in a Django cache (STORE_CART_CACHE_ALIAS) and expire
+    # STORE_CART_TTL seconds after their last change, so abandoned carts never
+    # touch the database. Checkout reads the cart from the cache directly.
+    # Concurrent writes to the same cart are last-writer-wins.
+    transactional = False
+    key = 'store:cart:{}'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'STORE_CART_CACHE_ALIAS', 'default')]
+        self.ttl = getattr(settings, 'STORE_CART_TTL', 60 * 60 * 24 * 7)
+
+    def load(self, cart_id):
+        return self.cache.get(self.key.format(cart_id))
+
+    def store(self, cart_id, data):
+        self.cache.set(self.key.format(cart_id), data, self.ttl)
+
+    def build_items(self, cart_id, data):
+        books = Book.objects.in_bulk([book_id for _, book_id, _ in data['items']])
+        return [
+            CartItem(id=item_id, cart_id=cart_id, book=books[book_id], quantity=quantity)
+            for item_id, book_id, quantity in data['items']
+            if book_id in books
+        ]
+
+    def create_cart(self):
+        cart = Cart(id=uuid4(), created_at=timezone.now())
+        self.store(cart.id, {'created_at': cart.created_at, 'next_item_id': 1, 'items': []})
+        set_prefetched(cart, 'items', [])
+        return cart
+
+    def get_cart(self, cart_id):
+        data = self.load(cart_id)
+        if data is None:
+            return None
+        cart = Cart(id=cart_id, created_at=data['created_at'])
+        set_prefetched(cart, 'items', self.build_items(cart_id, data))
+        return cart
+
+    def cart_exists(self, cart_id):
+        return self.load(cart_id) is not None
+
+    def delete_cart(self, cart_id):
+        self.cache.delete(self.key.format(cart_id))
+
+    def get_items(self, cart_id):
+        data = self.load(cart_id)
+        return self.build_items(cart_id, data) if data else []
+
+    def get_item(self, cart_id, item_id):
+        return next((item for item in self.get_items(cart_id) if str(item.id) == str(item_id)), None)
+
+    def add_items(self, cart_id, quantities):
+        data = self.load(cart_id)
+        if data is None:
+            return []
+        found = set(Book.objects.filter(pk__in=quantities).values_list('id', flat=True))
+        items = {book_id: [item_id, book_id, quantity] for item_id, book_id, quantity in data['items']}
+        for book_id in sorted(found):
+            if book_id in items:
+                items[book_id][2] += quantities[book_id]
+            else:
+                items[book_id] = [data['next_item_id'], book_id, quantities[book_id]]
+                data['next_item_id'] += 1
+        data['items'] = list(items.values())
+        self.store(cart_id, data)
+        return [
+            CartItem(id=item_id, cart_id=cart_id, book_id=book_id, quantity=quantity)
+            for item_id, book_id, quantity in data['items']
+            if book_id in found
+        ]
+
+    def update_item(self, item, quantity):
+        data = self.load(item.cart_id)
+        if data is not None:
+            data['items'] = [
+                [item_id, book_id, quantity if item_id == item.id else current]
+                for item_id, book_id, current in data['items']
+            ]
+            self.store(item.cart_id, data)
+        item.quantity = quantity
+        return item
+
+    def delete_item(self, item):
+        data = self.load(item.cart_id)
+        if data is not None:
+            data['items'] = [row for row in data['items'] if row[0] != item.id]
+            self.store(item.cart_id, data)
+
+
+def get_cart_backend():
+    path = getattr(settings, 'STORE_CART_BACKEND', 'store.carts.DatabaseCartBackend')
+    return import_string(path)()
@@ -0,0 +1,119 @@
+from django.db import transaction
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from store.models import Book, Category, Author, Publication, OrderItem
+
+
+# Book foreign key -> model carrying books_count / in_stock_books_count
+COUNTED_RELATIONS = {
+    'category_id': Category,
+    'author_id': Author,
+    'publication_id': Publication,
+}
+COUNTED_FIELDS = {'category', 'author', 'publication', 'stock'}
+
+
+def get_counter_state(values):
+    state = {field: values[field] for field in COUNTED_RELATIONS}
+    state['in_stock'] = values['stock'] > 0
+    return state
+
+
+def get_book_state(book:Book):
+    return get_counter_state({
+        'category_id': book.category_id,
+        'author_id': book.author_id,
+        'publication_id': book.publication_id,
+        'stock': book.stock,
+    })
+
+
+def load_book_state(book_id):
+    values = Book.objects.filter(pk=book_id).values(*COUNTED_RELATIONS, 'stock').first()
+    return get_counter_state(values) if values else None
+
+
+def apply_book_change(old, new):
+    # old/new are counter states (None for a created/deleted book)
+    for field, model in COUNTED_RELATIONS.items():
+        old_id = old[field] if old else None
+        new_id = new[field] if new else None
+        old_in_stock = bool(old and old['in_stock'])
+        new_in_stock = bool(new and new['in_stock'])
+
+        if old_id == new_id:
+            if old_id is not None and old_in_stock != new_in_stock:
+                model.objects.filter(pk=old_id).update(
+                    in_stock_books_count=F('in_stock_books_count') + (1 if new_in_stock else -1)
+                )
+            continue
+        if old_id is not None:
+            model.objects.filter(pk=old_id).update(
+                books_count=F('books_count') - 1,
+                in_stock_books_count=F('in_stock_books_count') - int(old_in_stock)
+            )
+        if new_id is not None:
+            model.objects.filter(pk=new_id).update(
+                books_count=F('books_count') + 1,
+                in_stock_books_count=F('in_stock_books_count') + int(new_in_stock)
+            )
+
+
+def recount(model, ids=None, chunk_size=1000):
+    field = next(field for field, counted in COUNTED_RELATIONS.items() if counted is model)
+    queryset = model.objects.only('id', 'books_count', 'in_stock_books_count').order_by('id')
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    last_id = 0
+    recounted = 0
+    while True:
+        objects = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not objects:
+            return recounted
+        counts = {
+            row[field]: row
+            for row in Book.objects.filter(**{f'{field}__in': [obj.id for obj in objects]})
+                .order_by()
+                .values(field)
+                .annotate(total=Count('id'), in_stock=Count('id', filter=Q(stock__gt=0)))
+        }
+        for obj in objects:
+            row = counts.get(obj.id, {'total': 0, 'in_stock': 0})
+            obj.books_count = row['total']
+            obj.in_stock_books_count = row['in_stock']
+        with transaction.atomic():
+            model.objects.bulk_update(objects, ['books_count', 'in_stock_books_count'])
+        last_id = objects[-1].id
+        recounted += len(objects)
+
+
+def recount_for_books(books):
+    # Recount every category/author/publication referenced by the given books
+    # (queryset or iterable of Book); for writes that bypass signals.
+    if hasattr(books, 'values_list'):
+        rows = books.values_list(*COUNTED_RELATIONS)
+    else:
+        rows = [[getattr(book, field) for field in COUNTED_RELATIONS] for book in books]
+    ids = {model: set() for model in COUNTED_RELATIONS.values()}
+    for row in rows:
+        for model, value in zip(COUNTED_RELATIONS.values(), row):
+            if value is not None:
+                ids[model].add(value)
+    for model, model_ids in ids.items():
+        if model_ids:
+            recount(model, model_ids)
+
+
+def update_order_totals(orders):
+    # Recomputes total_amount and item_count of the given Order queryset from
+    # its items in a single UPDATE.
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    return orders.update(
+        total_amount=Coalesce(
+            Subquery(items.annotate(total=Sum(F('quantity') * F('unit_price'))).values('total')),
+            Value(Decimal(0)),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        item_count=Coalesce(Subquery(items.annotate(count=Sum('quantity')).values('count')), Value(0))
+    )
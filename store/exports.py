@@ -0,0 +1,51 @@
+import csv
+from itertools import chain
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # File-like object for csv.writer that hands each line back instead of buffering it.
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, lookups, chunk_size):
+    # Walks the queryset in pk order, one LIMITed query per chunk seeking past
+    # the last pk. Unlike iterator(), this keeps memory flat on backends whose
+    # cursors buffer the whole result (MySQL).
+    queryset = queryset.order_by('pk').values_list('pk', *lookups)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def stream_export(queryset, fields, export_format, filename):
+    # fields maps output column names to queryset lookups; rows come in pk order.
+    columns = list(fields)
+    rows = iter_rows(queryset, fields.values(), EXPORT_CHUNK_SIZE)
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        content = chain(
+            [writer.writerow(columns)],
+            (writer.writerow(row) for row in rows)
+        )
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        content = (encoder.encode(dict(zip(columns, row))) + '\n' for row in rows)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
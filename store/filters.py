@@ -1,5 +1,7 @@
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 from .models import Book
+from .search import search
 
 
 class BookFilter(FilterSet):
@@ -8,4 +10,11 @@ class BookFilter(FilterSet):
         fields = {
             'category_id': ['exact'],
             'unit_price': ['gt', 'lt']
-        }
\ No newline at end of file
+        }
+
+
+class BookSearchFilter(SearchFilter):
+    # Ranked lookup against the BookSearchToken index instead of icontains scans.
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search(queryset, query)
\ No newline at end of file
@@ -0,0 +1,43 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def detect_format(path):
+    return FORMATS.get(Path(path).suffix.lower())
+
+
+def iter_records(path, file_format=None):
+    # Streams (line_number, record, error) tuples without reading the whole file.
+    file_format = file_format or detect_format(path)
+    if file_format == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record, None
+    elif file_format == 'jsonl':
+        with open(path, encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    yield line_number, None, f'Invalid JSON: {error}'
+                    continue
+                if not isinstance(record, dict):
+                    yield line_number, None, 'Expected a JSON object.'
+                    continue
+                yield line_number, record, None
+    else:
+        raise ValueError(f'Unsupported file format: {file_format or path}')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
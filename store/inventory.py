@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from store.cache import bump_version
+from store.counters import COUNTED_RELATIONS, apply_book_change, get_counter_state
+from store.models import Book
+
+
+class InsufficientStock(Exception):
+    def __init__(self, quantities):
+        self.quantities = quantities
+        super().__init__(quantities)
+
+    def get_shortages(self):
+        # Call after the checkout transaction has rolled back.
+        books = Book.objects.filter(pk__in=self.quantities).order_by('id').values('id', 'title', 'stock')
+        found = {book['id']: book for book in books}
+        return [
+            {
+                'id': book_id,
+                'title': found[book_id]['title'] if book_id in found else None,
+                'requested': quantity,
+                'available': found[book_id]['stock'] if book_id in found else 0,
+            }
+            for book_id, quantity in sorted(self.quantities.items())
+            if book_id not in found or found[book_id]['stock'] < quantity
+        ]
+
+
+def reserve_stock(quantities):
+    # quantities: {book_id: quantity}. Must run inside the checkout transaction,
+    # which the caller rolls back on InsufficientStock.
+    # A single conditional UPDATE decrements every book that has enough stock;
+    # checkouts only contend on the rows they buy, and the statement walks the
+    # primary key index so row locks are always taken in ascending id order.
+    requested = Case(
+        *[When(pk=book_id, then=Value(quantity)) for book_id, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+    updated = Book.objects.filter(pk__in=quantities, stock__gte=requested).update(
+        stock=F('stock') - requested,
+        last_update=timezone.now()
+    )
+    if updated != len(quantities):
+        raise InsufficientStock(quantities)
+
+    # Rows are locked by our UPDATE, so any book now at zero was sold out by this checkout.
+    for values in Book.objects.filter(pk__in=quantities, stock=0).values(*COUNTED_RELATIONS, 'stock'):
+        apply_book_change(get_counter_state({**values, 'stock': 1}), get_counter_state(values))
+    transaction.on_commit(lambda: bump_version(Book))
@@ -0,0 +1,52 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from store import sales
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the DailySales rollup from completed orders, one date range per transaction. '
+        'Re-running a range replaces its rows, so it is safe to repeat.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD); defaults to the first order.')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day, inclusive; defaults to today.')
+        parser.add_argument('--chunk-days', type=int, default=7)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between chunks.')
+
+    def handle(self, *args, **options):
+        start = options['start']
+        if start is None:
+            first_order = Order.objects.aggregate(first=Min('placed_at'))['first']
+            if first_order is None:
+                self.stdout.write('No orders to roll up.')
+                return
+            start = timezone.localdate(first_order)
+        end = (options['end'] or timezone.localdate()) + timedelta(days=1)
+        if start >= end:
+            raise CommandError('--start must not be after --end.')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1.')
+
+        started = time.monotonic()
+        total = 0
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days']), end)
+            with transaction.atomic():
+                rows = sales.rebuild(chunk_start, chunk_end)
+            total += rows
+            self.stdout.write(f'{chunk_start} - {chunk_end - timedelta(days=1)}: {rows} rows')
+            chunk_start = chunk_end
+            if options['sleep'] and chunk_start < end:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {total} rows from {start} to {end - timedelta(days=1)} in {time.monotonic() - started:.1f}s.'
+        ))
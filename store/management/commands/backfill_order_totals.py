@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from store.counters import update_order_totals
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total_amount and item_count of orders from their items, in id-range chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between chunks.')
+
+    def handle(self, *args, **options):
+        last_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        chunk_size = options['chunk_size']
+        started = time.monotonic()
+        updated = 0
+        for first_id in range(1, last_id + 1, chunk_size):
+            with transaction.atomic():
+                updated += update_order_totals(Order.objects.filter(id__gte=first_id, id__lt=first_id + chunk_size))
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{updated} orders ({updated / elapsed:.0f} rows/s)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Order totals updated for {updated} orders in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from store.benchmark import DEFAULT_MIX, PERCENTILES, Workload, compare, parse_mix, run
+
+
+SCALES = {
+    'small': {'users': 200, 'books': 2000, 'reviews': 2000, 'carts': 300, 'orders': 2000},
+    'medium': {'users': 2000, 'books': 20000, 'reviews': 20000, 'carts': 3000, 'orders': 20000},
+    'large': {'users': 20000, 'books': 200000, 'reviews': 200000, 'carts': 30000, 'orders': 200000},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the API in-process: seed a throwaway test database, drive a concurrent '
+        'request mix through the Django test client and report throughput, p50/p95/p99 '
+        'latency and query counts per endpoint. Save results with --output and flag '
+        'regressions against an earlier run with --compare; --mix checkout=1 measures checkout '
+        'throughput alone. On SQLite, concurrent checkouts '
+        'can fail with "database is locked" because SQLite allows one writer at a time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=100, help='Leading requests left out of the results.')
+        parser.add_argument(
+            '--mix', default='',
+            help=f"Endpoint weights, e.g. books_search=50,checkout=10. Endpoints: {', '.join(DEFAULT_MIX)}."
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', choices=SCALES, default='small', help='Size of the seeded test database.')
+        parser.add_argument(
+            '--use-existing', action='store_true',
+            help='Run against the configured database as it is instead of a seeded test database. '
+                 'Checkouts write real orders.'
+        )
+        parser.add_argument('--cold', action='store_true', help='Disable the catalog response cache.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', metavar='BASELINE', help='Compare with the results in this JSON file.')
+        parser.add_argument('--threshold', type=float, default=10, help='Regression threshold in percent.')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        except ValueError as error:
+            raise CommandError(error)
+        if options['requests'] <= options['warmup'] or options['concurrency'] < 1:
+            raise CommandError('--requests must exceed --warmup and --concurrency must be at least 1.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+        # Measure the production middleware stack, without the development-only debug toolbar.
+        overrides = override_settings(
+            MIDDLEWARE=[path for path in settings.MIDDLEWARE if not path.startswith('debug_toolbar.')],
+            **({'STORE_RESPONSE_CACHE_TIMEOUT': 0} if options['cold'] else {})
+        )
+
+        setup_test_environment(debug=False)
+        overrides.enable()
+        old_config = None
+        try:
+            if not options['use_existing']:
+                old_config = self.setup_database(options)
+            try:
+                workload = Workload(mix, options['requests'], options['seed'])
+            except ValueError as error:
+                raise CommandError(error)
+            self.stdout.write(f"Running {options['requests']} requests with concurrency {options['concurrency']}...")
+            results = run(workload, options['concurrency'], options['seed'], options['warmup'])
+            results['meta'].update(scale=None if options['use_existing'] else options['scale'], cold=options['cold'], mix=mix)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            overrides.disable()
+            teardown_test_environment()
+
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            self.print_comparison(baseline, results, options['threshold'])
+
+    def setup_database(self, options):
+        if connection.vendor == 'sqlite':
+            # Worker threads need a file they can share, not a private in-memory database.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'amar_boi_benchmark.sqlite3')
+        self.stdout.write(f"Creating and seeding a {options['scale']} test database...")
+        old_config = setup_databases(verbosity=0, interactive=False)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = WAL')
+        call_command('seed_scale', seed=options['seed'], stdout=open(os.devnull, 'w'), **SCALES[options['scale']])
+        return old_config
+
+    def print_results(self, results):
+        columns = ['requests', 'errors', 'throughput'] + [f'p{percent}_ms' for percent in PERCENTILES] + ['queries_avg', 'queries_max']
+        self.stdout.write(f"{'endpoint':<14}" + ''.join(f'{column:>13}' for column in columns))
+        for name, endpoint in results['endpoints'].items():
+            self.stdout.write(f'{name:<14}' + ''.join(self.format(endpoint[column]) for column in columns))
+        total = results['total']
+        self.stdout.write(f"total: {total['requests']} requests in {total['duration_s']:.1f}s ({total['throughput']:.1f} req/s)")
+
+    def print_comparison(self, baseline, results, threshold):
+        rows = compare(baseline, results, threshold)
+        regressions = [row for row in rows if row[-1]]
+        self.stdout.write(f"{'endpoint':<14}{'metric':<13}{'baseline':>11}{'current':>11}{'change':>9}")
+        for name, metric, before, now, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            self.stdout.write(f'{name:<14}{metric:<13}{before:>11.2f}{now:>11.2f}{change:>8.1f}%{flag}')
+        if regressions:
+            raise CommandError(f'{len(regressions)} metric(s) regressed by more than {threshold}%.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {threshold}%.'))
+
+    @staticmethod
+    def format(value):
+        if value is None:
+            return f"{'-':>13}"
+        return f'{value:>13.2f}' if isinstance(value, float) else f'{value:>13}'
@@ -0,0 +1,31 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the "customers who bought this also bought" tables from order items. '
+        'With --incremental only orders placed since the last build are added.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--top-k', type=int, default=getattr(settings, 'STORE_RECOMMENDATIONS_TOP_K', 20))
+        parser.add_argument('--min-count', type=int, default=1, help='Orders two books must share to be related.')
+        parser.add_argument('--block-size', type=int, default=10000, help='Books ranked per vectorized step.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            if options['incremental']:
+                items = recommendations.update(block_size=options['block_size'])
+            else:
+                items = recommendations.build(options['top_k'], options['min_count'], options['block_size'])
+        except FileNotFoundError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations built from {items} order items in {time.monotonic() - started:.1f}s '
+            f'({recommendations.get_directory()}).'
+        ))
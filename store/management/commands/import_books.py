@@ -0,0 +1,247 @@
+import time
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from store.cache import bump_version
+from store.counters import recount_for_books
+from store.importing import batched, iter_records
+from store.models import Author, Book, Category, Publication
+from store.search import index_books
+
+
+MAX_UNIT_PRICE = Decimal(10) ** 8
+TITLE_LENGTH = Book._meta.get_field('title').max_length
+SLUG_LENGTH = Book._meta.get_field('slug').max_length
+NAME_LENGTHS = {
+    'author': Author._meta.get_field('first_name').max_length,
+    'category': Category._meta.get_field('name').max_length,
+    'publication': Publication._meta.get_field('name').max_length,
+}
+BOOK_FIELDS = ['title', 'author_id', 'category_id', 'publication_id', 'unit_price', 'stock', 'description']
+
+
+class LookupCache:
+    # Natural key -> id, filled per batch with one SELECT and one bulk INSERT
+    # for the keys not seen before.
+    def __init__(self, model, key_fields):
+        self.model = model
+        self.key_fields = key_fields
+        self.ids = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        if missing:
+            self._load(missing)
+            unknown = missing - self.ids.keys()
+            if unknown:
+                self.model.objects.bulk_create([
+                    self.model(**dict(zip(self.key_fields, key))) for key in unknown
+                ])
+                self._load(unknown)
+
+    def _load(self, keys):
+        queryset = self.model.objects.filter(**{
+            f'{field}__in': {key[index] for key in keys}
+            for index, field in enumerate(self.key_fields)
+        }).order_by('id')
+        for row in queryset.values_list('id', *self.key_fields):
+            key = tuple(row[1:])
+            if key in keys:
+                self.ids.setdefault(key, row[0])
+
+    def get(self, key):
+        return self.ids.get(key) if key else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Import books from a CSV or JSONL file. Columns: title, slug (optional, defaults to '
+        'the slugified title, cut to the field length), author ("First Last"), category, publication, unit_price, stock, '
+        'description. Books are matched on slug and author, so re-running a file updates instead of '
+        'duplicating. A row repeating an earlier slug and author, or matching more than one existing '
+        'book, is reported as an error.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.authors = LookupCache(Author, ['first_name', 'last_name'])
+        self.categories = LookupCache(Category, ['name'])
+        self.publications = LookupCache(Publication, ['name'])
+        self.totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+        self.errors = []
+        # (slug, author) -> line number of the row that imported it.
+        self.seen = {}
+
+        try:
+            records = iter_records(options['path'], options['file_format'])
+            started = time.monotonic()
+            processed = 0
+            for batch in batched(records, options['batch_size']):
+                self.import_batch(batch)
+                processed += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{processed} rows ({processed / elapsed:.0f} rows/s)')
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        for line_number, message in self.errors:
+            self.stderr.write(f'line {line_number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {self.totals['created']}, updated {self.totals['updated']}, "
+            f"unchanged {self.totals['unchanged']}, failed {len(self.errors)} "
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
+
+    def parse(self, record):
+        title = (record.get('title') or '').strip()
+        if not title:
+            raise ValueError('title is required.')
+        if len(title) > TITLE_LENGTH:
+            raise ValueError(f'title must be at most {TITLE_LENGTH} characters.')
+        slug = (record.get('slug') or '').strip()
+        if slug:
+            try:
+                validate_slug(slug)
+            except ValidationError:
+                raise ValueError('slug may only contain ASCII letters, digits, hyphens and underscores.')
+            if len(slug) > SLUG_LENGTH:
+                raise ValueError(f'slug must be at most {SLUG_LENGTH} characters.')
+        else:
+            # Book.slug is an ASCII SlugField; titles without ASCII words need an explicit slug.
+            slug = slugify(title)[:SLUG_LENGTH].strip('-_')
+            if not slug:
+                raise ValueError('slug is required when the title has no ASCII letters or digits.')
+        try:
+            unit_price = Decimal(str(record.get('unit_price'))).quantize(Decimal('0.01'))
+            valid_price = 1 <= unit_price < MAX_UNIT_PRICE
+        except InvalidOperation:
+            raise ValueError('unit_price must be a number.')
+        if not valid_price:
+            raise ValueError(f'unit_price must be between 1 and {MAX_UNIT_PRICE}.')
+        try:
+            stock = int(record.get('stock') or 0)
+        except (TypeError, ValueError):
+            raise ValueError('stock must be an integer.')
+        if stock < 0:
+            raise ValueError('stock must not be negative.')
+        first_name, _, last_name = (record.get('author') or '').strip().partition(' ')
+        last_name = last_name.strip()
+        category = (record.get('category') or '').strip()
+        publication = (record.get('publication') or '').strip()
+        for field, values in (('author', [first_name, last_name]), ('category', [category]), ('publication', [publication])):
+            if any(len(value) > NAME_LENGTHS[field] for value in values):
+                raise ValueError(f'{field} names must be at most {NAME_LENGTHS[field]} characters.')
+        return {
+            'title': title,
+            'slug': slug,
+            'author': (first_name, last_name) if first_name else None,
+            'category': (category,) if category else None,
+            'publication': (publication,) if publication else None,
+            'unit_price': unit_price,
+            'stock': stock,
+            'description': record.get('description') or None,
+        }
+
+    def import_batch(self, batch):
+        rows = {}
+        for line_number, record, error in batch:
+            if error is None:
+                try:
+                    row = self.parse(record)
+                except ValueError as parse_error:
+                    error = str(parse_error)
+            if error is not None:
+                self.errors.append((line_number, error))
+                continue
+            key = (row['slug'], row['author'])
+            if key in self.seen:
+                self.errors.append((line_number, f'same slug and author as line {self.seen[key]}.'))
+                continue
+            self.seen[key] = line_number
+            rows[key] = dict(row, line_number=line_number)
+        if not rows:
+            return
+
+        try:
+            self.write_batch(rows)
+        except DatabaseError as error:
+            # The batch was rolled back: report its rows, forget the ids it
+            # may have cached and let later rows with the same keys through.
+            for key, row in rows.items():
+                self.errors.append((row['line_number'], f'batch failed: {error}'))
+                self.seen.pop(key, None)
+            for lookups in (self.authors, self.categories, self.publications):
+                lookups.ids.clear()
+
+    def write_batch(self, rows):
+        with transaction.atomic():
+            self.authors.resolve({row['author'] for row in rows.values() if row['author']})
+            self.categories.resolve({row['category'] for row in rows.values() if row['category']})
+            self.publications.resolve({row['publication'] for row in rows.values() if row['publication']})
+
+            existing = {}
+            for book in Book.objects.filter(slug__in={slug for slug, author in rows}).order_by('id'):
+                existing.setdefault((book.slug, book.author_id), []).append(book)
+
+            now = timezone.now()
+            to_create, to_update, touched, errors = [], [], [], []
+            unchanged = 0
+            for row in rows.values():
+                values = {
+                    'title': row['title'],
+                    'author_id': self.authors.get(row['author']),
+                    'category_id': self.categories.get(row['category']),
+                    'publication_id': self.publications.get(row['publication']),
+                    'unit_price': row['unit_price'],
+                    'stock': row['stock'],
+                    'description': row['description'],
+                }
+                matches = existing.get((row['slug'], values['author_id']), [])
+                if len(matches) > 1:
+                    errors.append((
+                        row['line_number'],
+                        f"{len(matches)} books have slug \"{row['slug']}\" and this author; give the row a unique slug."
+                    ))
+                    continue
+                if not matches:
+                    to_create.append(Book(slug=row['slug'], **values))
+                    continue
+                book = matches[0]
+                if any(getattr(book, field) != value for field, value in values.items()):
+                    touched.append(Book(
+                        category_id=book.category_id, author_id=book.author_id, publication_id=book.publication_id
+                    ))
+                    for field, value in values.items():
+                        setattr(book, field, value)
+                    book.last_update = now
+                    to_update.append(book)
+                else:
+                    unchanged += 1
+
+            Book.objects.bulk_create(to_create)
+            Book.objects.bulk_update(to_update, BOOK_FIELDS + ['last_update'])
+
+            # bulk_create/bulk_update skip signals: maintain the search index,
+            # counters and cache versions for the batch explicitly.
+            if to_create or to_update:
+                created_keys = {(book.slug, book.author_id) for book in to_create}
+                changed = [
+                    book for book in Book.objects.filter(slug__in={slug for slug, author in created_keys}).order_by('id')
+                    if (book.slug, book.author_id) in created_keys
+                ]
+                changed += to_update
+                index_books(changed)
+                recount_for_books(touched + changed)
+                transaction.on_commit(lambda: bump_version(Book, Author, Category, Publication))
+        self.errors += errors
+        self.totals['created'] += len(to_create)
+        self.totals['updated'] += len(to_update)
+        self.totals['unchanged'] += unchanged
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from store.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete carts (and their items) created more than --older-than days ago. '
+        'Works in small batches, each in its own transaction, so it can run from cron '
+        'next to live checkouts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, metavar='DAYS',
+            default=getattr(settings, 'STORE_CART_RETENTION_DAYS', 30)
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--older-than must not be negative and --batch-size must be positive.')
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        stale = Cart.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            carts = stale.count()
+            items = CartItem.objects.filter(cart__created_at__lt=cutoff).count()
+            self.stdout.write(f'Would delete {carts} carts and {items} cart items created before {cutoff:%Y-%m-%d %H:%M}.')
+            return
+
+        started = time.monotonic()
+        carts = items = 0
+        while True:
+            # Oldest first, walking the created_at index; a short transaction per batch.
+            with transaction.atomic():
+                ids = list(stale.order_by('created_at').values_list('id', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                items += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                carts += Cart.objects.filter(pk__in=ids).delete()[0]
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{carts} carts, {items} items ({(carts + items) / elapsed:.0f} rows/s)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {carts} carts and {items} cart items in {time.monotonic() - started:.1f}s.'
+        ))
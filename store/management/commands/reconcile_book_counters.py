@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from store.counters import COUNTED_RELATIONS, recount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored book counters on categories, authors and publications.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in COUNTED_RELATIONS.values():
+            started = time.monotonic()
+            recounted = recount(model, chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f'{model.__name__}: {recounted} rows in {time.monotonic() - started:.1f}s'
+            )
+        self.stdout.write(self.style.SUCCESS('Book counters reconciled.'))
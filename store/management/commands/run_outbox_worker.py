@@ -0,0 +1,73 @@
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Dispatch pending outbox events (order_created, ...) to their handlers. '
+        'Delivery is at least once: an event whose worker dies mid-batch is retried after its lease.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help='Threads dispatching events in parallel.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty.')
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--backoff', type=float, default=10.0, help='Seconds before the first retry; doubles on each attempt.')
+        parser.add_argument('--max-backoff', type=float, default=3600.0)
+        parser.add_argument('--lease', type=float, default=300.0, help='Seconds a claimed batch is hidden from other workers.')
+        parser.add_argument('--once', action='store_true', help='Drain the due events and exit.')
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while not self.stopping.is_set():
+                close_old_connections()
+                events = outbox.claim(options['batch_size'], options['lease'])
+                if not events:
+                    if options['once']:
+                        break
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+
+                started = time.monotonic()
+                results = list(executor.map(self.process, events))
+                done = [event for event, error in zip(events, results) if error is None]
+                outbox.mark_done(done)
+                for event, error in zip(events, results):
+                    if error is not None:
+                        outbox.mark_failed(
+                            event, error, options['max_attempts'], options['backoff'], options['max_backoff']
+                        )
+                        self.stderr.write(f'Event {event.id} ({event.topic}) failed, attempt {event.attempts}.')
+                processed += len(done)
+                failed += len(events) - len(done)
+                self.stdout.write(f'{len(done)}/{len(events)} events in {time.monotonic() - started:.2f}s')
+
+        self.stdout.write(self.style.SUCCESS(f'Outbox worker stopped: {processed} processed, {failed} failed.'))
+
+    def process(self, event):
+        # Runs in a pool thread; returns the error text, or None on success.
+        close_old_connections()
+        try:
+            outbox.dispatch(event)
+        except Exception:
+            return traceback.format_exc()
+        finally:
+            close_old_connections()
+        return None
+
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit.
+        self.stdout.write('Stopping after the current batch...')
+        self.stopping.set()
@@ -0,0 +1,328 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from uuid import NAMESPACE_URL, uuid5
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from store import sales
+from store.cache import bump_version
+from store.counters import COUNTED_RELATIONS, recount
+from store.models import (
+    Author,
+    Book,
+    Cart,
+    CartItem,
+    Category,
+    Customer,
+    Order,
+    OrderItem,
+    Publication,
+    Review,
+)
+from store.search import index_books
+
+
+WORDS = [
+    'river', 'night', 'golden', 'city', 'rain', 'moon', 'story', 'garden', 'secret', 'road',
+    'winter', 'letters', 'shadow', 'village', 'song', 'house', 'silent', 'fire', 'journey', 'island',
+    'নদী', 'রাত', 'সোনালী', 'শহর', 'বৃষ্টি', 'চাঁদ', 'গল্প', 'বাগান', 'রহস্য', 'পথ',
+    'শীত', 'চিঠি', 'ছায়া', 'গ্রাম', 'গান', 'বাড়ি', 'নীরব', 'আগুন', 'যাত্রা', 'দ্বীপ',
+]
+FIRST_NAMES = ['Humayun', 'Sunil', 'Rabindranath', 'Kazi', 'Jibanananda', 'Selina', 'Anisul', 'Tahmima', 'Sarat', 'Bibhutibhushan']
+LAST_NAMES = ['Ahmed', 'Gangopadhyay', 'Tagore', 'Islam', 'Das', 'Hossain', 'Haque', 'Anam', 'Chattopadhyay', 'Bandyopadhyay']
+PAYMENT_STATUSES = [Order.PAYMENT_STATUS_COMPLETE] * 7 + [Order.PAYMENT_STATUS_PENDING] * 2 + [Order.PAYMENT_STATUS_FAILED]
+MEMBERSHIPS = [Customer.MEMBERSHIP_BRONZE] * 7 + [Customer.MEMBERSHIP_SILVER] * 2 + [Customer.MEMBERSHIP_GOLD]
+CART_NAMESPACE = uuid5(NAMESPACE_URL, 'amar-boi:seed-scale:cart')
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    # bulk_create() would overwrite auto_now_add values with now().
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Zipf:
+    # Draws ids with probability proportional to 1 / rank ** exponent; ranks
+    # are shuffled so the most popular ids are spread over the id range.
+    def __init__(self, rng, ids, exponent):
+        self.rng = rng
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(self.ids) + 1)))
+
+    def sample(self, k=1):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate deterministic, production-shaped data for scale testing: users with '
+        'customers, authors, publications, categories, books, reviews, carts and orders. '
+        'Book popularity follows a Zipf-like distribution. Rows are appended with explicit '
+        'ids through bulk_create, so signals are skipped; book counters and the search '
+        'index are rebuilt for the new rows at the end. Running it again appends another set of rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--publications', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--items-per-order', type=float, default=3, help='Average order size.')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Popularity skew exponent.')
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many days.')
+        parser.add_argument('--password', default='password', help='Password of every seeded user.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--skip-index', action='store_true', help='Do not build the search index.')
+
+    def handle(self, *args, **options):
+        if any(options[name] < 0 for name in ('users', 'books', 'reviews', 'carts', 'orders')):
+            raise CommandError('Counts must not be negative.')
+        if options['items_per_order'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--items-per-order and --batch-size must be at least 1.')
+        if options['orders'] and not options['users']:
+            raise CommandError('Orders need --users.')
+        if options['books'] and min(options['authors'], options['publications'], options['categories']) < 1:
+            raise CommandError('Books need at least one author, publication and category.')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.started = time.monotonic()
+        self.tune_sqlite()
+
+        customer_ids = self.seed_users()
+        author_ids = self.seed_in_batches(Author, options['authors'], lambda pk: Author(
+            id=pk, first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES)
+        ))
+        publication_ids = self.seed_in_batches(Publication, options['publications'], lambda pk: Publication(
+            id=pk, name=f'{self.title(2).title()} Prokashoni'
+        ))
+        category_ids = self.seed_in_batches(Category, options['categories'], lambda pk: Category(
+            id=pk, name=self.title(1).title()
+        ))
+        book_ids, prices = self.seed_books(author_ids, publication_ids, category_ids)
+        if book_ids:
+            popular_books = Zipf(self.rng, book_ids, options['zipf'])
+            self.seed_reviews(popular_books)
+            self.seed_carts(popular_books)
+            self.seed_orders(popular_books, prices, customer_ids)
+            self.finish(book_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - self.started:.1f}s.'))
+
+    def tune_sqlite(self):
+        # Trade durability for load speed; these only last for this connection.
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA temp_store = MEMORY')
+                cursor.execute('PRAGMA cache_size = -262144')
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def title(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def report(self, label, started, total):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{label}: {total} rows ({total / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def seed_in_batches(self, model, count, build):
+        first_id = self.next_id(model)
+        started = time.monotonic()
+        for offset in range(0, count, self.batch_size):
+            objects = [build(pk) for pk in range(first_id + offset, first_id + min(offset + self.batch_size, count))]
+            with transaction.atomic():
+                model.objects.bulk_create(objects)
+            self.report(model.__name__, started, offset + len(objects))
+        return range(first_id, first_id + count)
+
+    def seed_users(self):
+        count = self.options['users']
+        if not count:
+            return range(0)
+        User = get_user_model()
+        password = make_password(self.options['password'])
+        first_id = self.next_id(User)
+        first_customer_id = self.next_id(Customer)
+        started = time.monotonic()
+        with explicit_timestamps(User._meta.get_field('date_joined')):
+            for offset in range(0, count, self.batch_size):
+                ids = range(first_id + offset, first_id + min(offset + self.batch_size, count))
+                users = [
+                    User(
+                        id=pk,
+                        username=f'seed{pk}',
+                        email=f'seed{pk}@example.com',
+                        password=password,
+                        first_name=self.rng.choice(FIRST_NAMES),
+                        last_name=self.rng.choice(LAST_NAMES),
+                        date_joined=self.now - timedelta(days=self.rng.random() * self.options['days'] * 2),
+                    )
+                    for pk in ids
+                ]
+                # Customers are normally created by a post_save signal, which bulk_create skips.
+                customers = [
+                    Customer(
+                        id=first_customer_id + pk - first_id,
+                        user_id=pk,
+                        phone=f'01{self.rng.randrange(10 ** 9):09d}',
+                        birth_date=date(1950, 1, 1) + timedelta(days=self.rng.randrange(20000)),
+                        membership=self.rng.choice(MEMBERSHIPS),
+                    )
+                    for pk in ids
+                ]
+                with transaction.atomic():
+                    User.objects.bulk_create(users)
+                    Customer.objects.bulk_create(customers)
+                self.report('User', started, offset + len(users))
+        return range(first_customer_id, first_customer_id + count)
+
+    def seed_books(self, author_ids, publication_ids, category_ids):
+        options = self.options
+        if not options['books']:
+            return range(0), {}
+        authors = Zipf(self.rng, author_ids, options['zipf'])
+        publications = Zipf(self.rng, publication_ids, options['zipf'])
+        categories = Zipf(self.rng, category_ids, options['zipf'])
+        prices = {}
+
+        def build(pk):
+            price = Decimal(self.rng.randrange(100, 1500)) + Decimal('0.00')
+            prices[pk] = price
+            return Book(
+                id=pk,
+                title=self.title(self.rng.randint(1, 4)).capitalize(),
+                slug=f'seed-book-{pk}',
+                author_id=authors.sample()[0],
+                category_id=categories.sample()[0],
+                publication_id=publications.sample()[0],
+                unit_price=price,
+                stock=0 if self.rng.random() < 0.1 else self.rng.randrange(1, 500),
+                description=' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randrange(5, 30))),
+            )
+
+        book_ids = self.seed_in_batches(Book, options['books'], build)
+        return book_ids, prices
+
+    def seed_reviews(self, books):
+        with explicit_timestamps(Review._meta.get_field('date')):
+            self.seed_in_batches(Review, self.options['reviews'], lambda pk: Review(
+                id=pk,
+                book_id=books.sample()[0],
+                name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                description=self.title(self.rng.randrange(3, 20)),
+                date=(self.now - timedelta(days=self.rng.random() * self.options['days'])).date(),
+            ))
+
+    def seed_carts(self, books):
+        count = self.options['carts']
+        started = time.monotonic()
+        first_item_id = self.next_id(CartItem)
+        # Cart ids are UUIDs: derive them from the seed and the rows already
+        # there, so a run is reproducible and a second run appends new ids.
+        run = f"{self.options['seed']}:{Cart.objects.count()}:{first_item_id}"
+        with explicit_timestamps(Cart._meta.get_field('created_at')):
+            for offset in range(0, count, self.batch_size):
+                carts, items = [], []
+                for index in range(offset, min(offset + self.batch_size, count)):
+                    cart = Cart(
+                        id=uuid5(CART_NAMESPACE, f'{run}:{index}'),
+                        created_at=self.now - timedelta(days=self.rng.random() * 60),
+                    )
+                    carts.append(cart)
+                    for book_id in dict.fromkeys(books.sample(self.rng.randrange(0, 6))):
+                        items.append(CartItem(
+                            id=first_item_id + len(items), cart_id=cart.id, book_id=book_id, quantity=self.rng.randint(1, 3)
+                        ))
+                first_item_id += len(items)
+                with transaction.atomic():
+                    Cart.objects.bulk_create(carts)
+                    CartItem.objects.bulk_create(items)
+                self.report('Cart', started, offset + len(carts))
+
+    def seed_orders(self, books, prices, customer_ids):
+        count = self.options['orders']
+        # Order sizes are geometric with the requested mean.
+        extra_item = 1 - 1 / self.options['items_per_order']
+        span = timedelta(days=self.options['days'])
+        first_id = self.next_id(Order)
+        item_id = self.next_id(OrderItem)
+        started = time.monotonic()
+        items_written = 0
+        with explicit_timestamps(Order._meta.get_field('placed_at')):
+            for offset in range(0, count, self.batch_size):
+                orders, items = [], []
+                for index in range(offset, min(offset + self.batch_size, count)):
+                    order = Order(
+                        id=first_id + index,
+                        customer_id=self.rng.choice(customer_ids),
+                        payment_status=self.rng.choice(PAYMENT_STATUSES),
+                        # Ids and timestamps increase together, as in production.
+                        placed_at=self.now - span + span * (index + self.rng.random()) / count,
+                    )
+                    orders.append(order)
+                    size = 1
+                    while self.rng.random() < extra_item:
+                        size += 1
+                    for book_id in dict.fromkeys(books.sample(size)):
+                        item = OrderItem(
+                            id=item_id, order_id=order.id, book_id=book_id,
+                            quantity=self.rng.choice((1, 1, 1, 1, 2, 2, 3)), unit_price=prices[book_id]
+                        )
+                        items.append(item)
+                        order.total_amount += item.unit_price * item.quantity
+                        order.item_count += item.quantity
+                        item_id += 1
+                with transaction.atomic():
+                    Order.objects.bulk_create(orders)
+                    OrderItem.objects.bulk_create(items)
+                items_written += len(items)
+                self.report('Order', started, offset + len(orders))
+        if count:
+            self.report('OrderItem', started, items_written)
+
+    def finish(self, book_ids):
+        started = time.monotonic()
+        for model in COUNTED_RELATIONS.values():
+            recount(model)
+        self.stdout.write(f'Book counters reconciled in {time.monotonic() - started:.1f}s')
+        if not self.options['skip_index']:
+            started = time.monotonic()
+            queryset = Book.objects.only('id', 'title', 'description').order_by('id')
+            for offset in range(0, len(book_ids), self.batch_size):
+                ids = book_ids[offset:offset + self.batch_size]
+                index_books(queryset.filter(id__gte=ids[0], id__lte=ids[-1]))
+            self.report('Search index', started, len(book_ids))
+        if self.options['orders']:
+            started = time.monotonic()
+            day = timezone.localdate(self.now - timedelta(days=self.options['days']))
+            end = timezone.localdate(self.now) + timedelta(days=1)
+            rows = 0
+            while day < end:
+                with transaction.atomic():
+                    rows += sales.rebuild(day, min(day + timedelta(days=7), end))
+                day += timedelta(days=7)
+            self.report('Daily sales', started, rows)
+        bump_version(Book, Author, Category, Publication)
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_book_counters(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    for model_name, field in [('Category', 'category'), ('Author', 'author'), ('Publication', 'publication')]:
+        books = Book.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        apps.get_model('store', model_name).objects.update(
+            books_count=Coalesce(Subquery(books.annotate(c=Count('id')).values('c')), 0),
+            in_stock_books_count=Coalesce(
+                Subquery(books.annotate(c=Count('id', filter=Q(stock__gt=0))).values('c')),
+                0
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_booksearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='in_stock_books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='in_stock_books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_book_counters, migrations.RunPython.noop),
+    ]
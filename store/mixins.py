@@ -0,0 +1,138 @@
+import hashlib
+from calendar import timegm
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from store.cache import get_cache, get_versions, get_response_cache_key, record
+
+
+class CachedResponseMixin:
+    # Models whose changes invalidate this viewset's cached list/retrieve data.
+    cache_dependencies = []
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = get_response_cache_key(
+            f'{self.basename}:{self.action}',
+            request,
+            kwargs,
+            get_versions(*self.cache_dependencies)
+        )
+        data = cache.get(key)
+        if data is not None:
+            record('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'STORE_RESPONSE_CACHE_TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class SparseFieldsMixin:
+    # ?fields=id,title trims and ?expand=author,category inlines related objects
+    # on reads, for serializers with expandable_fields (DynamicFieldsMixin).
+    # Expanded relations are select_related() so they never cost extra queries.
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_query_list(self, param):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return []
+        value = self.request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def get_expand(self):
+        expandable = getattr(self.get_serializer_class(), 'expandable_fields', {})
+        return [name for name in self.get_query_list(self.expand_query_param) if name in expandable]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        expand = self.get_expand()
+        return queryset.select_related(*expand) if expand else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if hasattr(self.get_serializer_class(), 'expandable_fields'):
+            kwargs.setdefault('fields', self.get_query_list(self.fields_query_param))
+            kwargs.setdefault('expand', self.get_expand())
+        return super().get_serializer(*args, **kwargs)
+
+
+class ValuesListMixin:
+    # Opt-in fast path for list(): fetches values() rows and renders them with
+    # values_serializer_class (see store.values) instead of building a model
+    # instance and running the DRF field machinery per row.
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None or getattr(self, 'get_expand', list)():
+            return super().list(request, *args, **kwargs)
+        serializer = self.values_serializer_class(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = serializer.columns
+        if hasattr(self.paginator, 'get_ordering'):
+            # Keyset cursors are built from the ordering columns of the last row.
+            columns = columns + [field.lstrip('-') for field in self.paginator.get_ordering(queryset)]
+        rows = queryset.values(*dict.fromkeys(columns))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
+
+
+class ConditionalGetMixin:
+    # Answers If-None-Match / If-Modified-Since before the object(s) are loaded
+    # or serialized. A list is validated by the cache_dependencies version
+    # counters (see CachedResponseMixin) and its normalized query string, so a
+    # 304 costs no queries; a single object by its last_modified_field.
+    last_modified_field = 'last_update'
+
+    def is_conditional(self):
+        # Objects inlined with ?expand= change without touching last_modified_field.
+        return not getattr(self, 'get_expand', list)()
+
+    def list(self, request, *args, **kwargs):
+        state = get_response_cache_key(
+            f'{self.basename}:list', request, kwargs, get_versions(*self.cache_dependencies)
+        )
+        return self.get_conditional_response(super().list, state, None, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_conditional():
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        last_modified = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        ).values_list(self.last_modified_field, flat=True).first()
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        state = get_response_cache_key(f'{self.basename}:retrieve', request, kwargs, [last_modified.isoformat()])
+        return self.get_conditional_response(super().retrieve, state, last_modified, request, *args, **kwargs)
+
+    def get_conditional_response(self, handler, state, last_modified, request, *args, **kwargs):
+        # Weak: the same data may be rendered as JSON or the browsable API.
+        etag = f'W/"{hashlib.md5(state.encode()).hexdigest()}"'
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import connection, models
 from django.conf import settings
 from django.contrib import admin
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from uuid import uuid4
 
 # Create your models here.
@@ -10,6 +11,8 @@ from uuid import uuid4
 # Category model
 class Category(models.Model):
     name = models.CharField(max_length=255)
+    books_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_books_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.name
@@ -28,6 +31,8 @@ class Author(models.Model):
     date_of_death = models.DateField(blank=True, null=True)
     nationality = models.CharField(max_length=100, blank=True, null=True)
     awards = models.TextField(blank=True, null=True)
+    books_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_books_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name}"
@@ -47,6 +52,8 @@ class Publication(models.Model):
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     established_date = models.DateField(blank=True, null=True)
     description = models.TextField(blank=True, null=True)
+    books_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_books_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -74,6 +81,16 @@ class Book(models.Model):
     class Meta:
         ordering = ['title']
 
+
+# Book search index model
+class BookSearchToken(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=50)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = [['token', 'book']]
+
 # Review Model
 class Review(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reviews')
@@ -85,7 +102,57 @@ class Review(models.Model):
 #Cart Model
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class CartItemManager(models.Manager):
+    def add(self, cart_id, quantities):
+        # Adds {book_id: quantity} to a cart in one INSERT ... SELECT upsert that
+        # increments the quantity of existing rows (bulk_create(update_conflicts=True)
+        # can only overwrite). Books or carts that do not exist are skipped, so an
+        # empty result means nothing was written. Returns the affected CartItems.
+        if not quantities:
+            return []
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        book_table = qn(Book._meta.db_table)
+        cart_table = qn(Cart._meta.db_table)
+        cart_field = self.model._meta.get_field('cart')
+        cart_value = cart_field.get_db_prep_value(cart_id, connection)
+        book_ids = list(quantities)
+
+        sql = (
+            f'INSERT INTO {table} ({qn("cart_id")}, {qn("book_id")}, {qn("quantity")}) '
+            f'SELECT %s, {qn("id")}, CASE {qn("id")} {" ".join(["WHEN %s THEN %s"] * len(book_ids))} END '
+            f'FROM {book_table} WHERE {qn("id")} IN ({", ".join(["%s"] * len(book_ids))}) '
+            f'AND EXISTS (SELECT 1 FROM {cart_table} WHERE {qn("id")} = %s) '
+        )
+        params = [cart_value]
+        for book_id in book_ids:
+            params += [book_id, quantities[book_id]]
+        params += book_ids + [cart_value]
+
+        returning = connection.vendor != 'mysql' and connection.features.can_return_columns_from_insert
+        if connection.vendor == 'mysql':
+            sql += f'ON DUPLICATE KEY UPDATE {qn("quantity")} = {qn("quantity")} + VALUES({qn("quantity")})'
+        else:
+            sql += (
+                f'ON CONFLICT ({qn("cart_id")}, {qn("book_id")}) '
+                f'DO UPDATE SET {qn("quantity")} = {table}.{qn("quantity")} + excluded.{qn("quantity")}'
+            )
+            if returning:
+                sql += f' RETURNING {qn("id")}, {qn("book_id")}, {qn("quantity")}'
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if returning:
+                rows = cursor.fetchall()
+        if not returning:
+            rows = self.filter(cart_id=cart_id, book_id__in=book_ids).values_list('id', 'book_id', 'quantity')
+        return [
+            self.model(id=item_id, cart_id=cart_id, book_id=book_id, quantity=quantity)
+            for item_id, book_id, quantity in sorted(rows, key=lambda row: row[1])
+        ]
 
 
 # Cart Item Model
@@ -96,6 +163,8 @@ class CartItem(models.Model):
         validators=[MinValueValidator(1)]
     )
 
+    objects = CartItemManager()
+
     class Meta:
         unique_together = [['cart', 'book']]
 
@@ -146,6 +215,10 @@ class Order(models.Model):
     placed_at = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # Stored totals of the order's items (item_count counts units), set at
+    # checkout and by store.counters.update_order_totals.
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
 
 
 # OrderItem model
@@ -155,3 +228,50 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+
+# Sales rollup model: totals of completed orders per day and book, kept up
+# to date by store.sales and rebuilt by `manage.py backfill_daily_sales`.
+# Category and publication are the book's at the time of the sale.
+class DailySales(models.Model):
+    date = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    publication = models.ForeignKey(Publication, on_delete=models.SET_NULL, null=True, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'book'], name='store_dailysales_date_book_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date']),
+            models.Index(fields=['publication', 'date']),
+        ]
+
+
+# Outbox model: side effects recorded in the same transaction as the change
+# that caused them, dispatched later by `manage.py run_outbox_worker`.
+class OutboxEvent(models.Model):
+    STATUS_PENDING = 'P'
+    STATUS_DONE = 'D'
+    STATUS_FAILED = 'F'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from store.models import Order, OutboxEvent
+from store.signals import order_created
+
+
+def enqueue(topic, payload):
+    # Call inside the transaction that makes the change; the event commits
+    # or rolls back with it.
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def dispatch_order_created(payload):
+    order = Order.objects.prefetch_related('items__book').get(pk=payload['order_id'])
+    order_created.send(sender=Order, order=order)
+
+
+# topic -> function(payload). Handlers may run more than once for an event
+# (at-least-once delivery), so receivers must be idempotent.
+HANDLERS = {
+    'order_created': dispatch_order_created,
+}
+
+
+def claim(batch_size, lease):
+    # Leases a batch of due events: they stay pending but are hidden for
+    # `lease` seconds, so a crashed worker's events are picked up again.
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = OutboxEvent.objects.filter(status=OutboxEvent.STATUS_PENDING, available_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        events = list(queryset.order_by('available_at', 'id')[:batch_size])
+        if events:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=lease)
+            )
+    for event in events:
+        event.attempts += 1
+    return events
+
+
+def dispatch(event):
+    handler = HANDLERS.get(event.topic)
+    if handler is None:
+        raise LookupError(f'No handler for outbox topic {event.topic!r}.')
+    handler(event.payload)
+
+
+def mark_done(events):
+    OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+        status=OutboxEvent.STATUS_DONE,
+        processed_at=timezone.now(),
+        last_error=''
+    )
+
+
+def mark_failed(event, error, max_attempts, backoff, max_backoff):
+    # Exponential backoff; after max_attempts the event is parked as failed.
+    now = timezone.now()
+    if event.attempts >= max_attempts:
+        values = {'status': OutboxEvent.STATUS_FAILED, 'processed_at': now}
+    else:
+        delay = min(backoff * 2 ** (event.attempts - 1), max_backoff)
+        values = {'available_at': now + timedelta(seconds=delay)}
+    OutboxEvent.objects.filter(pk=event.pk).update(last_error=error, **values)
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+from itertools import chain
+from pathlib import Path
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db.models import Max
+from store.models import Book, Order, OrderItem
+
+
+# One row per book id: its top-K co-purchased books, best first, padded with
+# book -1. Rows are indexed by book id, so a lookup is a single O(K) read.
+RECORD = np.dtype([('book', '<i4'), ('score', '<f4')])
+EMPTY = np.array((-1, 0), dtype=RECORD)
+TABLE_FILE = 'recommendations.npy'
+MATRIX_FILE = 'cooccurrence.npz'
+
+
+def get_directory():
+    return Path(getattr(settings, 'STORE_RECOMMENDATIONS_DIR', settings.BASE_DIR / 'recommendations'))
+
+
+def load_pairs(after=0, up_to=None, chunk_size=100000):
+    # (order id, book id) of every item of orders in (after, up_to] whose
+    # payment did not fail, as two int64 arrays.
+    queryset = OrderItem.objects.filter(order_id__gt=after).exclude(
+        order__payment_status=Order.PAYMENT_STATUS_FAILED
+    )
+    if up_to is not None:
+        queryset = queryset.filter(order_id__lte=up_to)
+    rows = queryset.order_by().values_list('order_id', 'book_id').iterator(chunk_size=chunk_size)
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+    return flat[0::2], flat[1::2]
+
+
+def cooccurrence(order_ids, book_ids, size):
+    # Book x book matrix of how many orders contain both books; the diagonal
+    # holds how many orders contain each book.
+    orders, order_index = np.unique(order_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(book_ids), dtype=np.int32), (order_index, book_ids)),
+        shape=(len(orders), size)
+    )
+    # The same book twice in an order still counts once.
+    baskets.data[:] = 1
+    return (baskets.T @ baskets).tocsr()
+
+
+def top_k(matrix, rows, k, min_count=1):
+    # Top-k neighbours of the given rows by cosine similarity of their order
+    # sets, co_count / sqrt(count_a * count_b), as a (len(rows), k) RECORD array.
+    counts = matrix.diagonal().astype(np.float64)
+    block = matrix[rows]
+    row_of = np.repeat(np.arange(len(rows)), np.diff(block.indptr))
+    neighbours = block.indices
+    co_counts = block.data
+    keep = (neighbours != rows[row_of]) & (co_counts >= min_count)
+    row_of, neighbours, co_counts = row_of[keep], neighbours[keep], co_counts[keep]
+    scores = co_counts / np.sqrt(counts[rows[row_of]] * counts[neighbours])
+
+    # Sort by row, best score first, ties to the lower book id; then keep
+    # the first k entries of each row.
+    order = np.lexsort((neighbours, -scores, row_of))
+    row_of, neighbours, scores = row_of[order], neighbours[order], scores[order]
+    rank = np.arange(len(row_of)) - np.searchsorted(row_of, row_of)
+    top = rank < k
+
+    result = np.full((len(rows), k), EMPTY, dtype=RECORD)
+    result['book'][row_of[top], rank[top]] = neighbours[top]
+    result['score'][row_of[top], rank[top]] = scores[top]
+    return result
+
+
+def fill(table, matrix, rows, k, min_count, block_size):
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        table[block] = top_k(matrix, block, k, min_count)
+
+
+def build(k, min_count=1, block_size=10000):
+    last_order_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+    order_ids, book_ids = load_pairs(up_to=last_order_id)
+    size = max(Book.objects.aggregate(last=Max('id'))['last'] or 0, int(book_ids.max(initial=0))) + 1
+    matrix = cooccurrence(order_ids, book_ids, size)
+    table = np.full((size, k), EMPTY, dtype=RECORD)
+    fill(table, matrix, np.flatnonzero(np.diff(matrix.indptr)), k, min_count, block_size)
+    save(table, matrix, {'last_order_id': last_order_id, 'top_k': k, 'min_count': min_count})
+    return len(order_ids)
+
+
+def update(block_size=10000):
+    # Adds the orders placed since the last build. Only books in those orders
+    # get new neighbour lists; the similarity of other pairs drifts slightly
+    # as counts grow until the next full build, which also picks up edited
+    # or deleted orders.
+    matrix, state = load_matrix()
+    last_order_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+    order_ids, book_ids = load_pairs(after=state['last_order_id'], up_to=last_order_id)
+    if not len(order_ids):
+        return 0
+
+    table = np.array(np.load(get_directory() / TABLE_FILE))
+    size = max(matrix.shape[0], int(book_ids.max()) + 1)
+    if size > matrix.shape[0]:
+        matrix.resize((size, size))
+        table = np.concatenate([table, np.full((size - len(table), state['top_k']), EMPTY, dtype=RECORD)])
+    matrix = (matrix + cooccurrence(order_ids, book_ids, size)).tocsr()
+    fill(table, matrix, np.unique(book_ids), state['top_k'], state['min_count'], block_size)
+    save(table, matrix, dict(state, last_order_id=last_order_id))
+    return len(order_ids)
+
+
+def save(table, matrix, state):
+    # Each file is swapped in atomically. The table goes first: if the matrix
+    # write fails, the next update recomputes the same rows again.
+    directory = get_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f'{TABLE_FILE}.tmp', 'wb') as file:
+        np.save(file, table)
+    os.replace(directory / f'{TABLE_FILE}.tmp', directory / TABLE_FILE)
+    with open(directory / f'{MATRIX_FILE}.tmp', 'wb') as file:
+        np.savez(
+            file, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+            shape=np.array(matrix.shape), state=np.array(json.dumps(state))
+        )
+    os.replace(directory / f'{MATRIX_FILE}.tmp', directory / MATRIX_FILE)
+
+
+def load_matrix():
+    path = get_directory() / MATRIX_FILE
+    if not path.exists():
+        raise FileNotFoundError(f'{path} does not exist; run a full build first.')
+    with np.load(path) as saved:
+        matrix = sparse.csr_matrix(
+            (saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape'])
+        )
+        return matrix, json.loads(str(saved['state']))
+
+
+_table = {'key': None, 'array': None}
+_table_lock = threading.Lock()
+
+
+def get_table():
+    # The table memory-mapped read-only; remapped when a build replaces the file.
+    path = get_directory() / TABLE_FILE
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    key = (str(path), stat.st_ino, stat.st_mtime_ns)
+    with _table_lock:
+        if _table['key'] != key:
+            _table['array'] = np.load(path, mmap_mode='r')
+            _table['key'] = key
+        return _table['array']
+
+
+def get_recommendations(book_id, limit=None):
+    # [(book id, score), ...] best first; empty for books without purchases.
+    table = get_table()
+    if table is None or not 0 <= book_id < len(table):
+        return []
+    row = table[book_id][:limit]
+    row = row[row['book'] >= 0]
+    return list(zip(row['book'].tolist(), row['score'].tolist()))
@@ -0,0 +1,80 @@
+from datetime import datetime, time
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from store.models import DailySales, Order, OrderItem
+
+
+def get_order_totals(queryset):
+    # OrderItem queryset -> rows of day, book, category, publication, units,
+    # revenue and order count; days follow the current time zone.
+    return queryset.annotate(day=TruncDate('order__placed_at')).values(
+        'day', 'book_id', 'book__category_id', 'book__publication_id'
+    ).annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        orders=Count('order_id', distinct=True)
+    ).order_by()
+
+
+def apply_order(order, sign):
+    # Adds (sign=1) or removes (sign=-1) a completed order's items in the
+    # rollup: one aggregate read, one INSERT of missing rows, one UPDATE.
+    day = timezone.localdate(order.placed_at)
+    totals = list(
+        OrderItem.objects.filter(order_id=order.id).values(
+            'book_id', 'book__category_id', 'book__publication_id'
+        ).annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        ).order_by()
+    )
+    if not totals:
+        return
+
+    with transaction.atomic():
+        DailySales.objects.bulk_create([
+            DailySales(
+                date=day,
+                book_id=row['book_id'],
+                category_id=row['book__category_id'],
+                publication_id=row['book__publication_id']
+            ) for row in totals
+        ], ignore_conflicts=True)
+        DailySales.objects.filter(date=day, book_id__in=[row['book_id'] for row in totals]).update(
+            units=F('units') + per_book(totals, 'units', sign, IntegerField()),
+            revenue=F('revenue') + per_book(totals, 'revenue', sign, DecimalField(max_digits=14, decimal_places=2)),
+            order_count=F('order_count') + sign
+        )
+
+
+def per_book(totals, field, sign, output_field):
+    return Case(
+        *[When(book_id=row['book_id'], then=Value(row[field] * sign)) for row in totals],
+        output_field=output_field
+    )
+
+
+def rebuild(start, end):
+    # Recomputes the rollup for days in [start, end) from the order history.
+    start_at = timezone.make_aware(datetime.combine(start, time.min))
+    end_at = timezone.make_aware(datetime.combine(end, time.min))
+    DailySales.objects.filter(date__gte=start, date__lt=end).delete()
+    rows = get_order_totals(OrderItem.objects.filter(
+        order__payment_status=Order.PAYMENT_STATUS_COMPLETE,
+        order__placed_at__gte=start_at,
+        order__placed_at__lt=end_at
+    ))
+    created = DailySales.objects.bulk_create([
+        DailySales(
+            date=row['day'],
+            book_id=row['book_id'],
+            category_id=row['book__category_id'],
+            publication_id=row['book__publication_id'],
+            units=row['units'],
+            revenue=row['revenue'],
+            order_count=row['orders']
+        ) for row in rows
+    ], batch_size=1000)
+    return len(created)
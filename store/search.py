@@ -0,0 +1,91 @@
+import re
+import string
+from collections import Counter
+from django.db import transaction
+from functools import reduce
+from operator import add, or_
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from store.models import Book, BookSearchToken
+
+
+# Split on whitespace and punctuation only, so words in scripts with
+# combining marks (e.g. Bangla) stay whole.
+TOKEN_PATTERN = re.compile('[^\\s' + re.escape(string.punctuation) + '।॥]+')
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = BookSearchToken._meta.get_field('token').max_length
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def build_tokens(book:Book):
+    weights = Counter()
+    for token in tokenize(book.title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(book.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return [
+        BookSearchToken(book_id=book.pk, token=token, weight=weight)
+        for token, weight in weights.items()
+    ]
+
+
+def index_books(books):
+    books = list(books)
+    with transaction.atomic():
+        BookSearchToken.objects.filter(book_id__in=[book.pk for book in books]).delete()
+        BookSearchToken.objects.bulk_create(
+            [token for book in books for token in build_tokens(book)],
+            batch_size=1000
+        )
+
+
+def rebuild_index(chunk_size=1000):
+    BookSearchToken.objects.all().delete()
+    queryset = Book.objects.only('id', 'title', 'description').order_by('id')
+    last_id = 0
+    indexed = 0
+    while True:
+        books = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not books:
+            return indexed
+        with transaction.atomic():
+            BookSearchToken.objects.bulk_create(
+                [token for book in books for token in build_tokens(book)],
+                batch_size=1000
+            )
+        last_id = books[-1].id
+        indexed += len(books)
+
+
+def search(queryset, query):
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return queryset
+    # Each query word matches indexed tokens it is a prefix of ("harr" finds
+    # "harry"). Books are ranked by how many query words they match, then by
+    # weight, with whole-word matches weighing double. Filtering before
+    # annotating restricts the aggregates to the matched tokens.
+    matches = [
+        Max(Case(When(search_tokens__token__startswith=token, then=Value(1)), default=Value(0)))
+        for token in tokens
+    ]
+    return queryset.filter(
+        reduce(or_, (Q(search_tokens__token__startswith=token) for token in tokens))
+    ).annotate(
+        search_matches=reduce(add, matches),
+        search_rank=Sum(Case(
+            When(search_tokens__token__in=tokens, then=F('search_tokens__weight') * 2),
+            default=F('search_tokens__weight'),
+            output_field=IntegerField()
+        ))
+    ).order_by('-search_matches', '-search_rank', 'title')
@@ -1,7 +1,14 @@
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from datetime import timedelta
 from decimal import Decimal
-from django.db import transaction
-from store.signals import order_created
+from django.db import connection, transaction
+from django.utils import timezone
+from store.inventory import InsufficientStock, reserve_stock
+from store.outbox import enqueue
+from store.carts import get_cart_backend
+from store.utils import set_prefetched
+from store.values import ValuesSerializer
 from store.models import (
     Category,
     Author,
@@ -16,11 +23,29 @@ from store.models import (
 )
 
 
+# Kept as the binary float 1.1 so price_with_tax renders exactly as before.
+TAX_RATE = Decimal(1.1)
+
+
+class DynamicFieldsMixin:
+    # fields=[...] keeps only the named fields; expand=[...] swaps the named
+    # foreign keys listed in expandable_fields for their nested representation.
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand or []:
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class CategorySerializer(serializers.ModelSerializer):
-    books_count = serializers.IntegerField(read_only=True)
     class Meta:
         model = Category
-        fields = ['id', 'name', 'books_count']
+        fields = ['id', 'name', 'books_count', 'in_stock_books_count']
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -33,7 +58,13 @@ class PublicationSerializer(serializers.ModelSerializer):
         model = Publication
         fields = '__all__'
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'author': AuthorSerializer,
+        'category': CategorySerializer,
+        'publication': PublicationSerializer,
+    }
+
     class Meta:
         model = Book
         fields = [
@@ -52,9 +83,15 @@ class BookSerializer(serializers.ModelSerializer):
     price_with_tax = serializers.SerializerMethodField(method_name='calculate_tax')
         
     def calculate_tax(self, book:Book):
-        return book.unit_price * Decimal(1.1)
+        return book.unit_price * TAX_RATE
     
 
+class BookValuesSerializer(ValuesSerializer):
+    computed_fields = {
+        'price_with_tax': (lambda row: row['unit_price'] * TAX_RATE, ['unit_price']),
+    }
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -85,7 +122,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'book', 'quantity', 'total_price' ]
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
@@ -93,39 +130,60 @@ class CartSerializer(serializers.ModelSerializer):
     def get_total_price(self, cart:Cart):
         return sum([item.quantity * item.book.unit_price for item in cart.items.all()])
 
+    def create(self, validated_data):
+        return get_cart_backend().create_cart()
+
     class Meta:
         model = Cart
         fields = ['id', 'items', 'total_price']
 
+class AddCartItemListSerializer(serializers.ListSerializer):
+    # Batch add: one book-existence query, then a single upsert for all rows.
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        quantities = {}
+        for item in self.validated_data:
+            quantities[item['book_id']] = quantities.get(item['book_id'], 0) + item['quantity']
+
+        found = set(Book.objects.filter(pk__in=quantities).values_list('id', flat=True))
+        missing = sorted(set(quantities) - found)
+        if missing:
+            raise serializers.ValidationError(
+                {'book_id': [f'No book with the given ID was found: {book_id}.' for book_id in missing]}
+            )
+        self.instance = get_cart_backend().add_items(cart_id, quantities)
+        if quantities and not self.instance:
+            raise NotFound('No cart with the given ID was found.')
+        return self.instance
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     book_id = serializers.IntegerField()
 
-    def validate_book_id(self, value):
-        if not Book.objects.filter(pk=value).exists():
-            raise serializers.ValidationError('No book with the given ID was found.')
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         book_id = self.validated_data['book_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, book_id=book_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
-        
+        cart_items = get_cart_backend().add_items(cart_id, {book_id: quantity})
+        if not cart_items:
+            if not Book.objects.filter(pk=book_id).exists():
+                raise serializers.ValidationError({'book_id': ['No book with the given ID was found.']})
+            raise NotFound('No cart with the given ID was found.')
+        self.instance = cart_items[0]
         return self.instance
+
     class Meta:
         model = CartItem
         fields = ['id', 'book_id', 'quantity']
+        list_serializer_class = AddCartItemListSerializer
 
     
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        return get_cart_backend().update_item(instance, validated_data['quantity'])
+
     class Meta:
         model = CartItem
         fields = ['quantity']
@@ -144,11 +202,14 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'book', 'unit_price', 'quantity']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
+    expandable_fields = {'customer': CustomerSerializer}
+
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'total_amount', 'item_count', 'items']
+        read_only_fields = ['total_amount', 'item_count']
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -160,35 +221,74 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError('No cart with the given ID was found.')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError('The cart is empty.')
-        return cart_id
-
+    # Checkout runs a fixed number of queries whatever the cart size: one read
+    # of the cart items with their books, one batched stock UPDATE, one sold-out
+    # check, the order, order item and outbox INSERTs and the cart delete. The
+    # order is returned with its items attached so it can be serialized without
+    # re-reading. order_created receivers run later, in run_outbox_worker.
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            customer = Customer.objects.get(user_id = self.context['user_id'])
-            order = Order.objects.create(customer=customer)
-            cart_items = CartItem.objects.select_related('book').filter(cart_id=cart_id)
-            
-            order_items = [
-                OrderItem(
-                    order=order,
-                    book=item.book,
-                    unit_price=item.book.unit_price,
-                    quantity=item.quantity
-                ) for item in cart_items
-            ]
-            
-            OrderItem.objects.bulk_create(order_items)
-            Cart.objects.filter(pk=cart_id).delete()
-            order_created.send_robust(self.__class__, order=order)
-    
-            return order
-        
-
-
-    
\ No newline at end of file
+        cart_id = self.validated_data['cart_id']
+        try:
+            with transaction.atomic():
+                order = self.place_order(cart_id)
+        except InsufficientStock as error:
+            raise serializers.ValidationError({'books': [
+                f"Insufficient stock for \"{book['title']}\" (id {book['id']}): "
+                f"requested {book['requested']}, available {book['available']}."
+                for book in error.get_shortages()
+            ] or ['Insufficient stock.']})
+        return order
+
+    def place_order(self, cart_id):
+        carts = get_cart_backend()
+        cart_items = list(carts.get_items(cart_id))
+        if not cart_items:
+            if not carts.cart_exists(cart_id):
+                raise serializers.ValidationError({'cart_id': ['No cart with the given ID was found.']})
+            raise serializers.ValidationError({'cart_id': ['The cart is empty.']})
+
+        reserve_stock({item.book_id: item.quantity for item in cart_items})
+
+        order = Order.objects.create(
+            customer_id=self.context['customer_id'],
+            total_amount=sum(item.book.unit_price * item.quantity for item in cart_items),
+            item_count=sum(item.quantity for item in cart_items)
+        )
+        order_items = [
+            OrderItem(
+                order=order,
+                book=item.book,
+                unit_price=item.book.unit_price,
+                quantity=item.quantity
+            ) for item in cart_items
+        ]
+        OrderItem.objects.bulk_create(order_items)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(OrderItem.objects.filter(order=order).values_list('book_id', 'id'))
+            for item in order_items:
+                item.id = ids[item.book_id]
+
+        if carts.transactional:
+            carts.delete_cart(cart_id)
+        else:
+            transaction.on_commit(lambda: carts.delete_cart(cart_id))
+        enqueue('order_created', {'order_id': order.id})
+        set_prefetched(order, 'items', order_items)
+        return order
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.IntegerField(required=False)
+    publication = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    interval = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+
+    def validate(self, data):
+        # Defaults to the last 30 days.
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({'start': ['start must not be after end.']})
+        return {**data, 'start': start, 'end': end}
@@ -1,7 +1,16 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from store.models import Customer
+from store.models import Customer, Book, Category, Author, Publication, Order
+from store import sales
+from store.search import index_books
+from store.cache import bump_version
+from store.counters import (
+    COUNTED_FIELDS,
+    apply_book_change,
+    get_book_state,
+    load_book_state
+)
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -9,3 +18,74 @@ def create_customer_for_new_user(sender, **kwargs):
     if kwargs['created']:
         Customer.objects.create(user=kwargs['instance'])
 
+
+@receiver(post_save, sender=Book)
+def index_book(sender, **kwargs):
+    update_fields = kwargs['update_fields']
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    index_books([kwargs['instance']])
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_counter_state(sender, **kwargs):
+    instance = kwargs['instance']
+    update_fields = kwargs['update_fields']
+    if update_fields is not None and not COUNTED_FIELDS & set(update_fields):
+        instance._counter_state = None
+    elif instance._state.adding or instance.pk is None:
+        instance._counter_state = {'old': None}
+    else:
+        instance._counter_state = {'old': load_book_state(instance.pk)}
+
+
+@receiver(post_save, sender=Book)
+def update_book_counters(sender, **kwargs):
+    instance = kwargs['instance']
+    state = getattr(instance, '_counter_state', None)
+    if state is not None:
+        apply_book_change(state['old'], get_book_state(instance))
+        instance._counter_state = None
+
+
+@receiver(post_delete, sender=Book)
+def release_book_counters(sender, **kwargs):
+    apply_book_change(get_book_state(kwargs['instance']), None)
+
+
+@receiver([post_save, post_delete], sender=Book)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Publication)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(pre_save, sender=Order)
+def remember_payment_status(sender, **kwargs):
+    instance = kwargs['instance']
+    update_fields = kwargs['update_fields']
+    if instance._state.adding or (update_fields is not None and 'payment_status' not in update_fields):
+        instance._old_payment_status = None
+    else:
+        instance._old_payment_status = Order.objects.filter(pk=instance.pk).values_list(
+            'payment_status', flat=True
+        ).first()
+
+
+# Orders count towards DailySales while their payment is complete.
+@receiver(post_save, sender=Order)
+def update_daily_sales(sender, **kwargs):
+    instance = kwargs['instance']
+    was_complete = getattr(instance, '_old_payment_status', None) == Order.PAYMENT_STATUS_COMPLETE
+    is_complete = instance.payment_status == Order.PAYMENT_STATUS_COMPLETE
+    if was_complete != is_complete:
+        sales.apply_order(instance, 1 if is_complete else -1)
+    instance._old_payment_status = instance.payment_status
+
+
+@receiver(pre_delete, sender=Order)
+def release_daily_sales(sender, **kwargs):
+    instance = kwargs['instance']
+    if instance.payment_status == Order.PAYMENT_STATUS_COMPLETE:
+        sales.apply_order(instance, -1)
@@ -1,3 +1,1466 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipIf
+from uuid import uuid4
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DataError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.authentication import user_cache
+from core.models import User
+from core.testing import QueryBudgetTestMixin
+from store.cache import get_cache, get_stats
+from store.carts import get_cart_backend
+from store import outbox, recommendations
+from store.models import (
+    Author, Book, BookSearchToken, Cart, CartItem, Category, Customer, DailySales, Order, OrderItem, OutboxEvent,
+    Publication, Review
+)
+from store.pagination import KeysetPagination
+from store.signals import order_created
+from store.views import BookViewSet, CategoryViewSet, OrderViewSet
+
 
 # Create your tests here.
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    buyers = 24
+    stock = 10
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Hot')
+        self.book = Book.objects.create(
+            title='Hot book', slug='hot-book', category=self.category, unit_price=10, stock=self.stock
+        )
+        self.checkouts = []
+        for index in range(self.buyers):
+            user = User.objects.create_user(username=f'buyer{index}', email=f'buyer{index}@example.com')
+            cart = Cart.objects.create()
+            CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+            self.checkouts.append((user, cart.id))
+
+    def checkout(self, user, cart_id, barrier, results):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            results.append(client.post('/orders/', {'cart_id': cart_id}).status_code)
+        finally:
+            connection.close()
+
+    @skipIf(connection.vendor == 'sqlite', 'SQLite allows a single writer, so checkouts cannot overlap.')
+    def test_concurrent_checkouts_never_oversell(self):
+        barrier = threading.Barrier(self.buyers)
+        results = []
+        threads = [
+            threading.Thread(target=self.checkout, args=(user, cart_id, barrier, results))
+            for user, cart_id in self.checkouts
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        self.book.refresh_from_db()
+        self.category.refresh_from_db()
+        self.assertEqual(self.book.stock, 0)
+        self.assertEqual(results.count(200), self.stock)
+        self.assertEqual(results.count(400), self.buyers - self.stock)
+        self.assertEqual(sum(OrderItem.objects.values_list('quantity', flat=True)), self.stock)
+        self.assertEqual(self.category.in_stock_books_count, 0)
+        self.assertLess(elapsed, 30)
+
+    def test_insufficient_stock_lists_offending_books(self):
+        user, cart_id = self.checkouts[0]
+        CartItem.objects.filter(cart_id=cart_id).update(quantity=self.stock + 5)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post('/orders/', {'cart_id': cart_id})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('requested 15, available 10', response.data['books'][0])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.stock, self.stock)
+
+
+class CheckoutQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index}', slug=f'book-{index}', category=category, unit_price=10, stock=1000)
+            for index in range(10)
+        ]
+
+    def create_cart(self, size):
+        carts = get_cart_backend()
+        cart = carts.create_cart()
+        carts.add_items(cart.id, {book.id: 2 for book in self.books[:size]})
+        return cart.id
+
+    def checkout(self, cart_id):
+        response = self.client.post('/orders/', {'cart_id': cart_id})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_expected_queries(self):
+        # Cart items with books, stock UPDATE, sold-out check, customer id,
+        # order and order item INSERTs, cart SELECT + 2 DELETEs, plus the
+        # savepoint pair TestCase wraps around the checkout transaction.
+        return 12 if connection.features.can_return_rows_from_bulk_insert else 13
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        expected = self.get_expected_queries()
+        for size in (1, 10):
+            cart_id = self.create_cart(size)
+            with self.assertNumQueries(expected):
+                response = self.checkout(cart_id)
+            self.assertEqual(len(response.data['items']), size)
+
+    def test_response_is_built_from_placed_order(self):
+        cart_id = self.create_cart(3)
+        response = self.checkout(cart_id)
+        order = Order.objects.get()
+        self.assertEqual(response.data['id'], order.id)
+        self.assertEqual(
+            [(item['id'], item['book']['id'], item['quantity']) for item in response.data['items']],
+            list(order.items.order_by('book_id').values_list('id', 'book_id', 'quantity'))
+        )
+
+    def test_order_totals_are_stored(self):
+        cart_id = self.create_cart(3)
+        response = self.checkout(cart_id)
+        self.assertEqual((response.data['total_amount'], response.data['item_count']), (Decimal('60.00'), 6))
+
+        Order.objects.update(total_amount=0, item_count=0)
+        call_command('backfill_order_totals', stdout=mock.Mock())
+        with CaptureQueriesContext(connection) as context:
+            orders = self.client.get('/orders/', {'fields': 'id,total_amount,item_count'}).data['results']
+        self.assertEqual(orders, [{'id': response.data['id'], 'total_amount': Decimal('60.00'), 'item_count': 6}])
+        self.assertFalse(any('"store_orderitem"' in query['sql'] for query in context.captured_queries))
+
+    def test_repeated_checkouts_keep_the_query_count(self):
+        # Throughput is measured by `manage.py benchmark --mix checkout=1`;
+        # here every checkout of a run must cost the same fixed number of queries.
+        expected = self.get_expected_queries()
+        counts = []
+        for size in [1, 5, 10] * 5:
+            cart_id = self.create_cart(size)
+            with CaptureQueriesContext(connection) as queries:
+                self.checkout(cart_id)
+            counts.append(len(queries))
+        self.assertEqual(counts, [expected] * 15)
+
+
+    def test_cart_is_deleted_once_the_order_commits(self):
+        carts = get_cart_backend()
+        cart_id = self.create_cart(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout(cart_id)
+            # The database backend deletes in the checkout transaction, the
+            # cache backend only after it commits.
+            self.assertEqual(carts.cart_exists(cart_id), not carts.transactional)
+        self.assertFalse(carts.cart_exists(cart_id))
+
+    def test_failed_checkout_keeps_the_cart(self):
+        carts = get_cart_backend()
+        cart_id = self.create_cart(2)
+        Book.objects.filter(pk=self.books[1].pk).update(stock=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/orders/', {'cart_id': cart_id}).status_code, 400)
+        self.assertEqual(len(carts.get_items(cart_id)), 2)
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(STORE_CART_BACKEND='store.carts.CacheCartBackend')
+class CacheCartCheckoutTests(CheckoutQueryCountTests):
+    def get_expected_queries(self):
+        # The items come from the cache with one book query, and the cart is
+        # deleted after commit: no cart SELECT or DELETEs.
+        return 9 if connection.features.can_return_rows_from_bulk_insert else 10
+
+
+class OutboxTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        category = Category.objects.create(name='Novels')
+        book = Book.objects.create(title='Book', slug='book', category=category, unit_price=10, stock=10)
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, book=book, quantity=1)
+        self.received = []
+        order_created.connect(self.receive)
+        self.addCleanup(order_created.disconnect, self.receive)
+        self.response = self.client.post('/orders/', {'cart_id': cart.id})
+
+    def receive(self, sender, order, **kwargs):
+        self.received.append((order.id, [item.book_id for item in order.items.all()]))
+
+    def run_worker(self, *args):
+        call_command('run_outbox_worker', '--once', '--workers', '1', *args, stdout=mock.Mock(), stderr=mock.Mock())
+
+    def test_checkout_defers_order_created(self):
+        self.assertEqual(self.response.status_code, 200)
+        self.assertEqual(self.received, [])
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.topic, event.payload), ('order_created', {'order_id': self.response.data['id']}))
+
+        self.run_worker()
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, OutboxEvent.STATUS_DONE)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(self.received, [(self.response.data['id'], [self.response.data['items'][0]['book']['id']])])
+
+    def test_failed_event_backs_off_then_gives_up(self):
+        with mock.patch.dict(outbox.HANDLERS, order_created=mock.Mock(side_effect=RuntimeError('down'))):
+            self.run_worker('--max-attempts', '2')
+            event = OutboxEvent.objects.get()
+            self.assertEqual((event.status, event.attempts), (OutboxEvent.STATUS_PENDING, 1))
+            self.assertIn('RuntimeError: down', event.last_error)
+            self.assertGreater(event.available_at, event.created_at)
+
+            OutboxEvent.objects.update(available_at=event.created_at)
+            self.run_worker('--max-attempts', '2')
+            event.refresh_from_db()
+            self.assertEqual((event.status, event.attempts), (OutboxEvent.STATUS_FAILED, 2))
+
+    def test_claimed_events_are_leased(self):
+        self.assertEqual(len(outbox.claim(10, lease=60)), 1)
+        self.assertEqual(outbox.claim(10, lease=60), [])
+
+
+class ValuesListParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Humayun', last_name='Ahmed')
+        publication = Publication.objects.create(name='Anyaprokash')
+        categories = [Category.objects.create(name=name) for name in ('Novels', 'Poetry', 'Empty')]
+        cls.books = [
+            Book.objects.create(
+                title=f'বই {index % 7}',
+                slug=f'book-{index}',
+                author=author if index % 3 else None,
+                publication=publication if index % 2 else None,
+                category=categories[index % 2],
+                unit_price=Decimal('1.05') + index * Decimal('13.37'),
+                stock=index % 4,
+                description=None if index % 5 else f'Description {index}',
+            )
+            for index in range(25)
+        ]
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        cls.buyer = User.objects.create_user(username='buyer', email='buyer@example.com')
+        for index, user in enumerate([cls.staff, cls.buyer] * 7):
+            order = Order.objects.create(
+                customer=Customer.objects.get(user=user),
+                payment_status=Order.PAYMENT_STATUS_CHOICES[index % 3][0]
+            )
+            for book in cls.books[index:index + index % 4]:
+                OrderItem.objects.create(order=order, book=book, quantity=index + 1, unit_price=book.unit_price)
+
+    def get_pages(self, path, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        pages = []
+        while path:
+            get_cache().clear()
+            response = client.get(path)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.content)
+            path = response.data.get('next')
+        return pages
+
+    def assertParity(self, viewset, path, user=None):
+        fast = self.get_pages(path, user)
+        with mock.patch.object(viewset, 'values_serializer_class', None):
+            slow = self.get_pages(path, user)
+        self.assertEqual(fast, slow)
+        return fast
+
+    def test_books(self):
+        self.assertEqual(len(self.assertParity(BookViewSet, '/books/')), 3)
+        for query in ('ordering=-unit_price', 'ordering=last_update', 'search=বই', 'fields=id,price_with_tax,description'):
+            with self.subTest(query=query):
+                self.assertParity(BookViewSet, f'/books/?{query}')
+
+    def test_categories(self):
+        self.assertParity(CategoryViewSet, '/categories/')
+
+    def test_orders(self):
+        for user in (self.staff, self.buyer):
+            with self.subTest(user=user.username):
+                self.assertParity(OrderViewSet, '/orders/', user)
+        self.assertParity(OrderViewSet, '/orders/?fields=id,items', self.staff)
+
+    def test_book_list_skips_model_instances(self):
+        with mock.patch.object(Book, '__init__', side_effect=AssertionError):
+            response = APIClient().get('/books/')
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class CustomerClaimTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='s3cret-pass')
+        other = User.objects.create_user(username='other', email='other@example.com')
+        self.order = Order.objects.create(customer=self.user.customer)
+        Order.objects.create(customer=other.customer)
+        self.client = APIClient()
+        response = self.client.post('/user/login/', {'username': 'reader', 'password': 's3cret-pass'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {response.data['access']}")
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+    def test_order_list_does_not_query_customers(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order['id'] for order in response.data['results']], [self.order.id])
+        sql = [query['sql'] for query in context.captured_queries]
+        self.assertFalse(any('"store_customer"' in statement for statement in sql), sql)
+
+
+class DailySalesTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        novels = Category.objects.create(name='Novels')
+        poetry = Category.objects.create(name='Poetry')
+        self.books = [
+            Book.objects.create(title='Novel', slug='novel', category=novels, unit_price=10, stock=100),
+            Book.objects.create(title='Poems', slug='poems', category=poetry, unit_price=5, stock=100),
+        ]
+        self.orders = [
+            self.place_order((self.books[0], 2, '10.00'), (self.books[1], 1, '5.00')),
+            self.place_order((self.books[0], 1, '9.50')),
+            self.place_order((self.books[1], 4, '5.00')),
+        ]
+
+    def place_order(self, *items):
+        order = Order.objects.create(customer=self.staff.customer)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, quantity=quantity, unit_price=Decimal(price))
+            for book, quantity, price in items
+        ])
+        return order
+
+    def complete(self, order, status=Order.PAYMENT_STATUS_COMPLETE):
+        order.payment_status = status
+        order.save()
+
+    def rollup(self):
+        return sorted(DailySales.objects.values_list('book__slug', 'units', 'revenue', 'order_count'))
+
+    def test_completed_orders_are_rolled_up(self):
+        self.assertEqual(self.rollup(), [])
+        self.complete(self.orders[0])
+        self.complete(self.orders[1])
+        self.complete(self.orders[1])
+        self.assertEqual(self.rollup(), [('novel', 3, Decimal('29.50'), 2), ('poems', 1, Decimal('5.00'), 1)])
+
+        self.complete(self.orders[1], Order.PAYMENT_STATUS_FAILED)
+        self.orders[0].delete()
+        self.assertEqual(self.rollup(), [('novel', 0, Decimal('0.00'), 0), ('poems', 0, Decimal('0.00'), 0)])
+
+    def test_backfill_matches_incremental_updates(self):
+        for order in self.orders[:2]:
+            self.complete(order)
+        Order.objects.filter(pk=self.orders[2].pk).update(payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        self.complete(self.orders[1], Order.PAYMENT_STATUS_FAILED)
+        incremental = self.rollup()
+
+        call_command('backfill_daily_sales', '--chunk-days', '1', stdout=mock.Mock())
+        self.assertEqual(self.rollup(), [('novel', 2, Decimal('20.00'), 1), ('poems', 5, Decimal('25.00'), 2)])
+        self.assertNotEqual(incremental, self.rollup())
+
+    def test_reports_read_the_rollup(self):
+        for order in self.orders:
+            self.complete(order)
+        top = self.client.get('/reports/sales/top-sellers/', {'limit': 1}).data['results']
+        self.assertEqual(top, [{'book_id': self.books[1].id, 'title': 'Poems', 'units': 5, 'revenue': Decimal('25.00'), 'orders': 2}])
+        categories = self.client.get('/reports/sales/by-category/').data['results']
+        self.assertEqual([(row['name'], row['revenue']) for row in categories], [('Novels', Decimal('29.50')), ('Poetry', Decimal('25.00'))])
+        series = self.client.get('/reports/sales/timeseries/', {'interval': 'month'}).data['results']
+        self.assertEqual([(row['units'], row['revenue']) for row in series], [(8, Decimal('54.50'))])
+        self.assertEqual(self.client.get('/reports/sales/timeseries/', {'interval': 'year'}).status_code, 400)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(STORE_RECOMMENDATIONS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        self.customer = user.customer
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index}', slug=f'book-{index}', category=category, unit_price=10, stock=100)
+            for index in range(6)
+        ]
+        # Book 0 is bought with 1 three times, with 2 once; 3 only in a failed order.
+        for books, status in (
+            ([0, 1], Order.PAYMENT_STATUS_COMPLETE),
+            ([0, 1, 2], Order.PAYMENT_STATUS_PENDING),
+            ([1, 0, 0], Order.PAYMENT_STATUS_COMPLETE),
+            ([0, 3], Order.PAYMENT_STATUS_FAILED),
+            ([2, 4], Order.PAYMENT_STATUS_COMPLETE),
+        ):
+            self.place_order(books, status)
+
+    def place_order(self, books, status=Order.PAYMENT_STATUS_PENDING):
+        order = Order.objects.create(customer=self.customer, payment_status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=self.books[index], quantity=1, unit_price=10) for index in books
+        ])
+
+    def neighbours(self, index):
+        return [
+            (self.books.index(Book.objects.get(pk=book)), round(score, 3))
+            for book, score in recommendations.get_recommendations(self.books[index].id)
+        ]
+
+    def test_build_ranks_by_cosine_similarity(self):
+        recommendations.build(k=2)
+        self.assertEqual(self.neighbours(0), [(1, 1.0), (2, 0.408)])
+        self.assertEqual(self.neighbours(4), [(2, 0.707)])
+        self.assertEqual(self.neighbours(3), [])
+        self.assertEqual(self.neighbours(5), [])
+
+    def test_incremental_update_matches_full_build(self):
+        recommendations.build(k=3)
+        self.place_order([4, 5])
+        self.place_order([2, 5, 0])
+        self.books.append(Book.objects.create(title='New', slug='new', unit_price=10, stock=100))
+        self.place_order([6, 5])
+        recommendations.update()
+        incremental = {index: self.neighbours(index) for index in (0, 2, 4, 5, 6)}
+
+        recommendations.build(k=3)
+        self.assertEqual(incremental, {index: self.neighbours(index) for index in (0, 2, 4, 5, 6)})
+
+    def test_endpoint(self):
+        recommendations.build(k=5)
+        client = APIClient()
+        with self.assertNumQueries(1):
+            response = client.get(f'/books/{self.books[0].id}/recommendations/', {'limit': 1})
+        self.assertEqual(response.data, [
+            {'id': self.books[1].id, 'title': 'Book 1', 'unit_price': Decimal('10.00'), 'score': 1.0}
+        ])
+        self.assertEqual(client.get(f'/books/{self.books[5].id}/recommendations/').data, [])
+        self.assertEqual(client.get('/books/999/recommendations/').status_code, 404)
+        self.assertEqual(client.get(f'/books/{self.books[0].id}/recommendations/?limit=x').status_code, 400)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        author = Author.objects.create(first_name='Humayun', last_name='Ahmed')
+        publication = Publication.objects.create(name='Anyaprokash')
+        self.category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(
+                title=f'Book {index}', slug=f'book-{index}', author=author, publication=publication,
+                category=self.category, unit_price=10 + index, stock=100
+            )
+            for index in range(12)
+        ]
+        for book in self.books:
+            Review.objects.create(book=book, name='Reader', description='Good')
+
+    def request(self, method, path, data=None, status=200, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = getattr(self.client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+        return self.assertWithinQueryBudget(response)
+
+    def test_budgets_are_declared(self):
+        self.assertQueryBudgetsDeclared('store.urls')
+
+    def test_catalog_routes(self):
+        book = self.books[0]
+        for resource, data in (
+            ('categories', {'name': 'Poetry'}),
+            ('authors', {'first_name': 'Jibanananda', 'last_name': 'Das'}),
+            ('publications', {'name': 'Prothoma'}),
+        ):
+            pk = self.request('post', f'/{resource}/', data, status=201).data['id']
+            self.request('get', f'/{resource}/')
+            self.request('get', f'/{resource}/{pk}/')
+            self.request('put', f'/{resource}/{pk}/', data)
+            self.request('patch', f'/{resource}/{pk}/', data)
+            self.request('delete', f'/{resource}/{pk}/', status=204)
+
+        data = {'title': 'New', 'slug': 'new', 'category': self.category.id, 'unit_price': 10, 'stock': 5}
+        pk = self.request('post', '/books/', data, status=201).data['id']
+        self.request('get', '/books/')
+        self.request('get', '/books/?expand=author,category,publication')
+        self.request('get', '/books/?search=book')
+        self.request('get', f'/books/{pk}/')
+        self.request('put', f'/books/{pk}/', data)
+        self.request('patch', f'/books/{pk}/', {'stock': 3})
+        self.request('delete', f'/books/{pk}/', status=204)
+        self.request('get', '/books/export/')
+        self.request('get', f'/books/{book.id}/recommendations/')
+
+        review = self.request('post', f'/books/{book.id}/reviews/', {'name': 'A', 'description': 'B'}, status=201).data['id']
+        self.request('get', f'/books/{book.id}/reviews/')
+        self.request('get', f'/books/{book.id}/reviews/{review}/')
+        self.request('put', f'/books/{book.id}/reviews/{review}/', {'name': 'A', 'description': 'C'})
+        self.request('patch', f'/books/{book.id}/reviews/{review}/', {'description': 'D'})
+        self.request('delete', f'/books/{book.id}/reviews/{review}/', status=204)
+
+    def test_customer_routes(self):
+        customer = Customer.objects.get(user=self.buyer)
+        data = {'phone': '017', 'birth_date': None, 'membership': 'G'}
+        self.request('get', '/customers/')
+        self.request('get', f'/customers/{customer.id}/')
+        self.request('put', f'/customers/{customer.id}/', data)
+        self.request('patch', f'/customers/{customer.id}/', data)
+        self.request('get', '/customers/me/')
+        self.request('put', '/customers/me/', data)
+        other = User.objects.create_user(username='other', email='other@example.com')
+        self.request('delete', f'/customers/{other.customer.id}/', status=204)
+
+    def test_cart_and_order_routes(self):
+        cart = self.request('post', '/carts/', status=201).data['id']
+        item = self.request('post', f'/carts/{cart}/items/', {'book_id': self.books[0].id, 'quantity': 1}, status=201).data['id']
+        batch = [{'book_id': book.id, 'quantity': 2} for book in self.books[:10]]
+        self.request('post', f'/carts/{cart}/items/batch/', batch, status=201)
+        self.request('get', f'/carts/{cart}/')
+        self.request('get', f'/carts/{cart}/items/')
+        self.request('get', f'/carts/{cart}/items/{item}/')
+        self.request('patch', f'/carts/{cart}/items/{item}/', {'quantity': 3})
+        self.request('delete', f'/carts/{cart}/items/{item}/', status=204)
+
+        for user in (self.buyer, self.staff):
+            order = self.request('post', '/orders/', {'cart_id': cart}, user=user).data['id']
+            cart = self.request('post', '/carts/', status=201).data['id']
+            self.request('post', f'/carts/{cart}/items/batch/', batch, status=201)
+            self.request('get', '/orders/')
+            self.request('get', f'/orders/{order}/')
+        self.request('patch', f'/orders/{order}/', {'payment_status': 'C'})
+        self.request('get', '/orders/export/')
+        self.request('get', '/reports/sales/top-sellers/')
+        self.request('get', '/reports/sales/by-category/')
+        self.request('get', '/reports/sales/by-publication/')
+        self.request('get', '/reports/sales/timeseries/?interval=week')
+        self.request('delete', f'/orders/{order}/', status=204)
+        self.request('delete', f'/carts/{cart}/', status=204)
+
+    def test_all_routes_are_exercised(self):
+        self.test_catalog_routes()
+        self.test_customer_routes()
+        self.test_cart_and_order_routes()
+        # Customers are created for new users by a signal; POST /customers/
+        # cannot set user_id, so it has no working request to measure.
+        self.assertAllRoutesExercised('store.urls', exclude=['CustomerViewSet.create'])
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.category = Category.objects.create(name='Novels')
+        self.potter = self.create_book('Harry Potter', 'A boy wizard.')
+        self.harrison = self.create_book('Street Life', 'Harrison walks the street.')
+        self.field = self.create_book("Potter's Field", 'A mystery about harry and a potter.')
+
+    def create_book(self, title, description=''):
+        return Book.objects.create(
+            title=title, slug=title.lower().replace(' ', '-'), description=description,
+            category=self.category, unit_price=10, stock=5
+        )
+
+    def search(self, query):
+        response = APIClient().get('/books/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [book['title'] for book in response.data['results']]
+
+    def test_prefixes_match(self):
+        self.assertEqual(self.search('harr'), ['Harry Potter', "Potter's Field", 'Street Life'])
+        self.assertEqual(self.search('wiz'), ['Harry Potter'])
+        self.assertEqual(self.search('zzz'), [])
+
+    def test_ranking(self):
+        # Books matching more words come first, then title over description
+        # and whole words over prefixes.
+        self.assertEqual(self.search('harry potter'), ['Harry Potter', "Potter's Field"])
+        self.assertEqual(self.search('potter'), ["Potter's Field", 'Harry Potter'])
+        self.assertEqual(self.search('street'), ['Street Life'])
+
+    def test_index_follows_book_changes(self):
+        self.potter.title = 'Goblet of Fire'
+        self.potter.save()
+        self.assertEqual(self.search('goblet'), ['Goblet of Fire'])
+        self.assertNotIn('Goblet of Fire', self.search('harry'))
+        self.harrison.delete()
+        self.assertEqual(self.search('harrison'), [])
+        Book.objects.filter(pk=self.field.pk).update(title='Unindexed')
+        self.assertEqual(self.search('unindexed'), [])
+
+    def test_rebuild_search_index(self):
+        Book.objects.filter(pk=self.field.pk).update(title='Renamed Field')
+        BookSearchToken.objects.filter(book=self.potter).delete()
+        call_command('rebuild_search_index', '--chunk-size', '2', stdout=mock.Mock())
+        self.assertEqual(self.search('renamed'), ['Renamed Field'])
+        self.assertEqual(self.search('wizard'), ['Harry Potter'])
+        self.assertEqual(self.search('potter'), ['Harry Potter', 'Renamed Field'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        category = Category.objects.create(name='Novels')
+        # 25 books; prices repeat so ?ordering=unit_price has ties across pages.
+        self.books = Book.objects.bulk_create([
+            Book(title=f'Book {index:02}', slug=f'book-{index:02}', category=category, unit_price=index % 3 + 1, stock=1)
+            for index in range(25)
+        ])
+        self.client = APIClient()
+
+    def walk(self, url, direction='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([book['title'] for book in response.data['results']])
+            url = response.data[direction]
+        return pages
+
+    def test_next_and_previous_cursors(self):
+        pages = self.walk('/books/')
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), [f'Book {index:02}' for index in range(25)])
+
+        first = self.client.get('/books/').data
+        self.assertIsNone(first['previous'])
+        last = self.client.get(self.client.get(first['next']).data['next']).data
+        self.assertIsNone(last['next'])
+        self.assertEqual(self.walk(last['previous'], 'previous'), pages[1::-1])
+
+    def test_ties_are_broken_by_pk(self):
+        pages = self.walk('/books/?ordering=unit_price')
+        expected = sorted(self.books, key=lambda book: (book.unit_price, book.pk))
+        self.assertEqual(sum(pages, []), [book.title for book in expected])
+
+    def test_descending_custom_ordering(self):
+        pages = self.walk('/books/?ordering=-unit_price')
+        expected = sorted(self.books, key=lambda book: (-book.unit_price, book.pk))
+        self.assertEqual(sum(pages, []), [book.title for book in expected])
+
+    def test_count_only_when_asked(self):
+        self.assertNotIn('count', self.client.get('/books/').data)
+        data = self.client.get('/books/?count=approx').data
+        self.assertEqual((data['count'], data['count_exact']), (25, True))
+        with mock.patch.object(KeysetPagination, 'approximate_count_limit', 20):
+            data = self.client.get('/books/?count=approx&ordering=unit_price').data
+        self.assertEqual((data['count'], data['count_exact']), (20, False))
+
+    def test_malformed_cursors(self):
+        other_ordering = self.client.get('/books/?ordering=unit_price').data['next'].split('cursor=')[1]
+        for cursor in ['garbage', 'bm90IGpzb24=', 'eyJvIjpbXX0=', other_ordering]:
+            response = self.client.get('/books/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.category = Category.objects.create(name='Novels')
+        self.book = Book.objects.create(title='Dune', slug='dune', category=self.category, unit_price=10, stock=5)
+        self.client = APIClient()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.get('/books/'), 'MISS')
+        self.assertEqual(self.get('/books/'), 'HIT')
+        self.assertEqual(self.get(f'/books/{self.book.id}/'), 'MISS')
+        self.assertEqual(self.get(f'/books/{self.book.id}/'), 'HIT')
+        self.assertEqual(get_stats(), {'hits': 2, 'misses': 2})
+
+    def test_error_responses_are_not_cached(self):
+        self.assertEqual(self.client.get('/books/0/').status_code, 404)
+        self.assertEqual(self.client.get('/books/0/').status_code, 404)
+        self.assertEqual(get_stats(), {'hits': 0, 'misses': 2})
+
+    def test_model_changes_bump_versions(self):
+        self.get('/books/')
+        self.get('/categories/')
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+        self.assertEqual(self.get('/books/'), 'MISS')
+        self.assertEqual(self.get('/categories/'), 'MISS')
+        self.assertEqual(self.client.get('/books/').data['results'][0]['title'], 'Dune Messiah')
+
+        # A dependency other than the listed model invalidates too; unrelated ones do not.
+        Author.objects.create(first_name='Frank', last_name='Herbert')
+        self.assertEqual(self.get('/books/'), 'MISS')
+        self.assertEqual(self.get('/categories/'), 'HIT')
+        Review.objects.create(book=self.book, name='Reader', description='Good.')
+        self.assertEqual(self.get('/books/'), 'HIT')
+
+    def test_book_changes_refresh_counters_in_cached_lists(self):
+        # Counters are written with UPDATE, which fires no Author/Publication signals.
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        publication = Publication.objects.create(name='Chilton')
+        for url in ('/authors/', '/publications/'):
+            self.assertEqual(self.client.get(url).data['results'][0]['books_count'], 0)
+        Book.objects.create(
+            title='Dune Messiah', slug='dune-messiah', category=self.category, author=author,
+            publication=publication, unit_price=10, stock=5
+        )
+        for url in ('/authors/', '/publications/'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS', url)
+            self.assertEqual(response.data['results'][0]['books_count'], 1, url)
+
+    def test_checkout_bumps_book_version(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, book=self.book, quantity=2)
+        self.get(f'/books/{self.book.id}/')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/orders/', {'cart_id': cart.id}).status_code, 200)
+        self.assertEqual(self.get(f'/books/{self.book.id}/'), 'MISS')
+        self.assertEqual(self.client.get(f'/books/{self.book.id}/').data['stock'], 3)
+
+    def test_keys_follow_the_query(self):
+        self.get('/books/', ordering='unit_price', category_id=self.category.id)
+        self.assertEqual(self.get('/books/', ordering='-unit_price', category_id=self.category.id), 'MISS')
+        # Parameter order and empty parameters do not split entries.
+        self.assertEqual(self.get(f'/books/?category_id={self.category.id}&search=&ordering=unit_price'), 'HIT')
+        self.assertEqual(self.get('/books/', ordering='unit_price', category_id=self.category.id, search='dune'), 'MISS')
+        self.assertEqual(self.get(f'/books/{self.book.id}/', fields='id'), 'MISS')
+        self.assertEqual(self.get(f'/books/{self.book.id}/'), 'MISS')
+
+    def test_entries_are_shared_between_users(self):
+        # Catalog responses do not depend on who asks, so anonymous and
+        # signed-in users read the same entries.
+        self.get('/books/')
+        self.client.force_authenticate(User.objects.create_user(username='reader', email='reader@example.com'))
+        self.assertEqual(self.get('/books/'), 'HIT')
+        self.client.force_authenticate(User.objects.create_user(username='staff', email='staff@example.com', is_staff=True))
+        self.assertEqual(self.get('/books/'), 'HIT')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index:02}', slug=f'book-{index:02}', category=category, unit_price=index, stock=1)
+            for index in range(12)
+        ]
+        self.client = APIClient()
+
+    def test_list_not_modified_without_queries(self):
+        response = self.client.get('/books/')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get('/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.books[0].stock = 0
+        self.books[0].save()
+        response = self.client.get('/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_variants_have_their_own_etags(self):
+        first = self.client.get('/books/')
+        variants = [
+            first.data['next'],
+            '/books/?ordering=-unit_price',
+            '/books/?fields=id,title',
+            '/books/?expand=category',
+        ]
+        etags = {first['ETag']}
+        for url in variants:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 200, url)
+            etags.add(response['ETag'])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304, url)
+        self.assertEqual(len(etags), len(variants) + 1)
+        # The same parameters in another order are the same variant.
+        response = self.client.get('/books/?unit_price__gt=1&ordering=unit_price')
+        self.assertEqual(
+            self.client.get('/books/?ordering=unit_price&unit_price__gt=1', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+
+    def test_retrieve(self):
+        url = f'/books/{self.books[0].id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotIn('ETag', self.client.get(url, {'expand': 'category'}))
+
+        self.books[0].title = 'Renamed'
+        self.books[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Renamed')
+
+
+class BookCounterTests(TestCase):
+    def setUp(self):
+        self.novels = Category.objects.create(name='Novels')
+        self.poetry = Category.objects.create(name='Poetry')
+        self.author = Author.objects.create(first_name='Humayun', last_name='Ahmed')
+        self.publication = Publication.objects.create(name='Anyaprokash')
+
+    def create_book(self, title, stock, category=None):
+        return Book.objects.create(
+            title=title, slug=title.lower(), category=category or self.novels, author=self.author,
+            publication=self.publication, unit_price=10, stock=stock
+        )
+
+    def assertCounts(self, obj, books_count, in_stock_books_count):
+        obj.refresh_from_db()
+        self.assertEqual((obj.books_count, obj.in_stock_books_count), (books_count, in_stock_books_count), obj)
+
+    def test_create_update_move_and_delete(self):
+        book = self.create_book('Himu', stock=3)
+        self.create_book('Misir Ali', stock=0)
+        for obj in (self.novels, self.author, self.publication):
+            self.assertCounts(obj, 2, 1)
+
+        book.title = 'Himu Again'
+        book.save()
+        self.assertCounts(self.novels, 2, 1)
+
+        book.category = self.poetry
+        book.save()
+        self.assertCounts(self.novels, 1, 0)
+        self.assertCounts(self.poetry, 1, 1)
+        self.assertCounts(self.author, 2, 1)
+
+        book.delete()
+        self.assertCounts(self.poetry, 0, 0)
+        self.assertCounts(self.author, 1, 0)
+        self.assertCounts(self.publication, 1, 0)
+
+    def test_stock_crossing_zero(self):
+        book = self.create_book('Himu', stock=1)
+        book.stock = 0
+        book.save()
+        self.assertCounts(self.novels, 1, 0)
+        book.stock = 5
+        book.save()
+        self.assertCounts(self.novels, 1, 1)
+        book.stock = 2
+        book.save()
+        self.assertCounts(self.novels, 1, 1)
+
+    def test_checkout_selling_out(self):
+        book = self.create_book('Himu', stock=2)
+        other = self.create_book('Misir Ali', stock=5)
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([CartItem(cart=cart, book=book, quantity=2), CartItem(cart=cart, book=other, quantity=1)])
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='buyer', email='buyer@example.com'))
+        self.assertEqual(client.post('/orders/', {'cart_id': cart.id}).status_code, 200)
+        self.assertCounts(self.novels, 2, 1)
+        self.assertCounts(self.author, 2, 1)
+
+    def corrupt(self):
+        self.create_book('Himu', stock=3)
+        self.create_book('Misir Ali', stock=0, category=self.poetry)
+        for model in (Category, Author, Publication):
+            model.objects.update(books_count=7, in_stock_books_count=7)
+
+    def assertReconciled(self):
+        self.assertCounts(self.novels, 1, 1)
+        self.assertCounts(self.poetry, 1, 0)
+        self.assertCounts(self.author, 2, 1)
+        self.assertCounts(self.publication, 2, 1)
+
+    def test_backfill_migration(self):
+        self.corrupt()
+        migration = import_module('store.migrations.0014_book_counters')
+        migration.populate_book_counters(apps, None)
+        self.assertReconciled()
+
+    def test_reconcile_command(self):
+        self.corrupt()
+        call_command('reconcile_book_counters', '--chunk-size', '1', stdout=mock.Mock())
+        self.assertReconciled()
+
+
+class ImportBooksTests(TestCase):
+    def import_books(self, *records):
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+            file.flush()
+            call_command('import_books', file.name, '--batch-size', '2', stdout=mock.Mock(), stderr=stderr)
+        return stderr.getvalue()
+
+    def books(self):
+        return sorted(Book.objects.values_list('title', 'slug', 'author__last_name', 'unit_price', 'stock'))
+
+    def test_same_title_by_different_authors(self):
+        records = [
+            {'title': 'Collected Poems', 'author': 'Jibanananda Das', 'category': 'Poetry', 'unit_price': 300, 'stock': 2},
+            {'title': 'Collected Poems', 'author': 'Kazi Nazrul', 'category': 'Poetry', 'unit_price': 250, 'stock': 4},
+            {'title': 'Padma Nadir Majhi', 'author': 'Manik Bandopadhyay', 'category': 'Novels', 'unit_price': 180},
+        ]
+        self.assertEqual(self.import_books(*records), '')
+        expected = [
+            ('Collected Poems', 'collected-poems', 'Das', Decimal('300.00'), 2),
+            ('Collected Poems', 'collected-poems', 'Nazrul', Decimal('250.00'), 4),
+            ('Padma Nadir Majhi', 'padma-nadir-majhi', 'Bandopadhyay', Decimal('180.00'), 0),
+        ]
+        self.assertEqual(self.books(), expected)
+        self.assertEqual(Category.objects.get(name='Poetry').books_count, 2)
+
+        # Re-running the same file changes nothing.
+        updated = Book.objects.order_by('id').values_list('last_update', flat=True)
+        self.assertEqual(self.import_books(*records), '')
+        self.assertEqual(self.books(), expected)
+        self.assertEqual(list(Book.objects.order_by('id').values_list('last_update', flat=True)), list(updated))
+
+    def test_rows_update_their_own_book(self):
+        self.import_books(
+            {'title': 'Collected Poems', 'author': 'Jibanananda Das', 'category': 'Poetry', 'unit_price': 300, 'stock': 2},
+            {'title': 'Collected Poems', 'author': 'Kazi Nazrul', 'category': 'Poetry', 'unit_price': 250, 'stock': 4},
+        )
+        self.import_books(
+            {'title': 'Collected Poems', 'author': 'Kazi Nazrul', 'category': 'Songs', 'unit_price': 275, 'stock': 0},
+        )
+        self.assertEqual(self.books(), [
+            ('Collected Poems', 'collected-poems', 'Das', Decimal('300.00'), 2),
+            ('Collected Poems', 'collected-poems', 'Nazrul', Decimal('275.00'), 0),
+        ])
+        self.assertEqual(Category.objects.get(name='Poetry').books_count, 1)
+        self.assertEqual(Category.objects.get(name='Songs').books_count, 1)
+
+    def test_collisions_are_reported(self):
+        category = Category.objects.create(name='Novels')
+        for index in range(2):
+            Book.objects.create(title='Twin', slug='twin', category=category, unit_price=10, stock=index)
+        errors = self.import_books(
+            {'title': 'Twin', 'unit_price': 12},
+            {'title': 'Solo', 'unit_price': 20},
+            {'title': 'Solo', 'unit_price': 30},
+        )
+        self.assertIn('line 1: 2 books have slug "twin" and this author', errors)
+        self.assertIn('line 3: same slug and author as line 2.', errors)
+        self.assertEqual(self.books(), [
+            ('Solo', 'solo', None, Decimal('20.00'), 0),
+            ('Twin', 'twin', None, Decimal('10.00'), 0),
+            ('Twin', 'twin', None, Decimal('10.00'), 1),
+        ])
+
+
+    def test_rows_are_checked_against_the_model_fields(self):
+        long_title = 'A Very Long Title ' * 4
+        errors = self.import_books(
+            {'title': long_title.strip(), 'unit_price': 10},
+            {'title': 'পথের পাঁচালী', 'unit_price': 10},
+            {'title': 'পথের পাঁচালী', 'slug': 'pather-panchali', 'unit_price': 10},
+            {'title': 'Bad slug', 'slug': 'পথের', 'unit_price': 10},
+            {'title': 'Long slug', 'slug': 'x' * 51, 'unit_price': 10},
+            {'title': 'x' * 201, 'unit_price': 10},
+            {'title': 'Long author', 'author': 'A ' + 'b' * 256, 'unit_price': 10},
+            {'title': 'Long category', 'category': 'c' * 256, 'unit_price': 10},
+        )
+        self.assertEqual(errors.splitlines(), [
+            'line 2: slug is required when the title has no ASCII letters or digits.',
+            'line 4: slug may only contain ASCII letters, digits, hyphens and underscores.',
+            'line 5: slug must be at most 50 characters.',
+            'line 6: title must be at most 200 characters.',
+            'line 7: author names must be at most 255 characters.',
+            'line 8: category names must be at most 255 characters.',
+        ])
+        self.assertEqual(
+            sorted(Book.objects.values_list('slug', flat=True)),
+            ['a-very-long-title-a-very-long-title-a-very-long-ti', 'pather-panchali']
+        )
+
+    def test_database_errors_fail_only_their_batch(self):
+        records = [{'title': f'Book {index}', 'author': f'Author {index}', 'unit_price': 10} for index in range(4)]
+        original = Book.objects.bulk_create
+        calls = []
+
+        def fail_first_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise DataError('value too long')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(Book.objects, 'bulk_create', side_effect=fail_first_batch):
+            errors = self.import_books(*records)
+        self.assertEqual(errors.splitlines(), ['line 1: batch failed: value too long', 'line 2: batch failed: value too long'])
+        self.assertEqual(sorted(Book.objects.values_list('title', 'author__last_name')), [('Book 2', '2'), ('Book 3', '3')])
+        self.assertFalse(Author.objects.filter(last_name__in=['0', '1']).exists())
+        # The failed rows import on a later run.
+        self.assertEqual(self.import_books(*records), '')
+        self.assertEqual(Book.objects.count(), 4)
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.novels = Category.objects.create(name='Novels')
+        poetry = Category.objects.create(name='Poetry')
+        self.books = [
+            Book.objects.create(
+                title=f'Book {index}', slug=f'book-{index}', category=self.novels if index % 2 else poetry,
+                unit_price=Decimal('9.50') + index, stock=index
+            ) for index in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='staff', email='staff@example.com', is_staff=True))
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        anonymous = APIClient()
+        customer = APIClient()
+        customer.force_authenticate(User.objects.create_user(username='reader', email='reader@example.com'))
+        for url in ('/books/export/', '/orders/export/'):
+            self.assertEqual(anonymous.get(url).status_code, 401)
+            self.assertEqual(customer.get(url).status_code, 403)
+        self.assertEqual(self.client.get('/books/export/', {'export_format': 'xml'}).status_code, 400)
+
+    def test_csv(self):
+        response = self.client.get('/books/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'title', 'slug'])
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], [book.title for book in self.books])
+
+    def test_json_lines_in_pk_chunks(self):
+        with mock.patch('store.exports.EXPORT_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            content = self.export('/books/export/', export_format='jsonl')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [book.id for book in self.books])
+        self.assertEqual(rows[1]['category'], 'Novels')
+        self.assertEqual(rows[1]['unit_price'], '10.50')
+        chunks = [query['sql'] for query in queries.captured_queries if 'store_book' in query['sql']]
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all('LIMIT 2' in sql for sql in chunks))
+
+    def test_filters_pass_through(self):
+        content = self.export('/books/export/', export_format='jsonl', category_id=self.novels.id, unit_price__gt=11)
+        self.assertEqual([json.loads(line)['title'] for line in content.splitlines()], ['Book 3'])
+
+    def test_orders(self):
+        customer = User.objects.create_user(username='buyer', email='buyer@example.com').customer
+        orders = [Order.objects.create(customer=customer) for index in range(2)]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, quantity=1, unit_price=book.unit_price)
+            for order in orders for book in self.books[:2]
+        ])
+        lines = self.export('/orders/export/').splitlines()
+        self.assertEqual(lines[0], 'order_id,placed_at,payment_status,customer_id,item_id,book_id,book_title,quantity,unit_price')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(order.id) for order in orders for book in range(2)])
+
+
+class CartItemUpsertTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index}', slug=f'book-{index}', category=category, unit_price=10, stock=5)
+            for index in range(3)
+        ]
+        self.cart = Cart.objects.create()
+
+    def add(self, quantities):
+        items = CartItem.objects.add(self.cart.id, quantities)
+        return [(item.book_id, item.quantity) for item in items]
+
+    def stored(self):
+        return list(CartItem.objects.filter(cart=self.cart).order_by('book_id').values_list('book_id', 'quantity'))
+
+    def test_adding_a_book_again_sums_quantities(self):
+        first, second = self.books[:2]
+        self.assertEqual(self.add({first.id: 2}), [(first.id, 2)])
+        item_id = CartItem.objects.get(book=first).id
+        self.assertEqual(self.add({second.id: 1, first.id: 3}), [(first.id, 5), (second.id, 1)])
+        self.assertEqual(self.stored(), [(first.id, 5), (second.id, 1)])
+        self.assertEqual(CartItem.objects.get(book=first).id, item_id)
+
+    def test_missing_books_and_carts_are_skipped(self):
+        self.assertEqual(self.add({self.books[0].id: 1, 0: 2}), [(self.books[0].id, 1)])
+        self.assertEqual(CartItem.objects.add(uuid4(), {self.books[1].id: 1}), [])
+        self.assertEqual(self.add({}), [])
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_without_returning(self):
+        self.add({self.books[0].id: 1})
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False):
+            with self.assertNumQueries(2):
+                result = self.add({self.books[0].id: 1, self.books[2].id: 4})
+        self.assertEqual(result, [(self.books[0].id, 2), (self.books[2].id, 4)])
+
+    @skipIf(connection.vendor != 'sqlite', 'SQLite upsert syntax')
+    def test_sqlite_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add({self.books[0].id: 1})
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertIn('ON CONFLICT ("cart_id", "book_id") DO UPDATE SET "quantity" = "store_cartitem"."quantity" + excluded."quantity"', sql)
+        self.assertIn('RETURNING', sql)
+
+    def test_mysql_sql(self):
+        # MySQL cannot run here: record the upsert instead of executing it,
+        # then let the follow-up SELECT read the (empty) table.
+        statements = []
+
+        def record_insert(execute, sql, params, many, context):
+            if sql.startswith('INSERT'):
+                statements.append(sql)
+                return None
+            return execute(sql, params, many, context)
+
+        with mock.patch.object(connection, 'vendor', 'mysql'), connection.execute_wrapper(record_insert):
+            self.assertEqual(self.add({self.books[0].id: 1}), [])
+        qn = connection.ops.quote_name
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].endswith(
+            f'ON DUPLICATE KEY UPDATE {qn("quantity")} = {qn("quantity")} + VALUES({qn("quantity")})'
+        ))
+        self.assertNotIn('RETURNING', statements[0])
+
+    def test_batch_endpoint(self):
+        client = APIClient()
+        first, second = self.books[:2]
+        url = f'/carts/{self.cart.id}/items/batch/'
+        response = client.post(url, [{'book_id': first.id, 'quantity': 1}, {'book_id': 0, 'quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored(), [])
+
+        response = client.post(url, [
+            {'book_id': first.id, 'quantity': 1}, {'book_id': second.id, 'quantity': 2}, {'book_id': first.id, 'quantity': 3}
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stored(), [(first.id, 4), (second.id, 2)])
+
+
+class CartTests(TestCase):
+    # Runs against the database backend; CacheCartTests repeats it for the cache backend.
+    def setUp(self):
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index}', slug=f'book-{index}', category=category, unit_price=10, stock=5)
+            for index in range(3)
+        ]
+        self.client = APIClient()
+        self.cart_id = self.client.post('/carts/').data['id']
+        self.url = f'/carts/{self.cart_id}/items/'
+
+    def items(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return sorted((item['book']['id'], item['quantity']) for item in response.data)
+
+    def test_create_and_delete_cart(self):
+        response = self.client.get(f'/carts/{self.cart_id}/')
+        self.assertEqual((response.data['items'], response.data['total_price']), ([], 0))
+        self.assertEqual(self.client.delete(f'/carts/{self.cart_id}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/carts/{self.cart_id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/carts/{uuid4()}/').status_code, 404)
+        self.assertEqual(self.client.get('/carts/not-a-uuid/').status_code, 404)
+
+    def test_items(self):
+        first, second = self.books[:2]
+        response = self.client.post(self.url, {'book_id': first.id, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        item_id = response.data['id']
+        self.assertEqual(self.client.post(self.url, {'book_id': first.id, 'quantity': 1}).data['id'], item_id)
+        self.client.post(self.url, {'book_id': second.id, 'quantity': 1})
+        self.assertEqual(self.items(), [(first.id, 3), (second.id, 1)])
+        self.assertEqual(self.client.get(f'{self.url}{item_id}/').data['quantity'], 3)
+
+        self.assertEqual(self.client.patch(f'{self.url}{item_id}/', {'quantity': 5}).status_code, 200)
+        self.assertEqual(self.client.get(f'/carts/{self.cart_id}/').data['total_price'], 60)
+        self.assertEqual(self.client.delete(f'{self.url}{item_id}/').status_code, 204)
+        self.assertEqual(self.items(), [(second.id, 1)])
+        self.assertEqual(self.client.get(f'{self.url}{item_id}/').status_code, 404)
+
+    def test_unknown_books_and_carts(self):
+        self.assertEqual(self.client.post(self.url, {'book_id': 0, 'quantity': 1}).status_code, 400)
+        url = f'/carts/{uuid4()}/items/'
+        self.assertEqual(self.client.post(url, {'book_id': self.books[0].id, 'quantity': 1}).status_code, 404)
+        self.assertEqual(self.items(), [])
+
+    def test_batch_add(self):
+        first, second = self.books[:2]
+        batch = [{'book_id': first.id, 'quantity': 1}, {'book_id': 0, 'quantity': 1}]
+        self.assertEqual(self.client.post(f'{self.url}batch/', batch, format='json').status_code, 400)
+        self.assertEqual(self.items(), [])
+
+        self.client.post(self.url, {'book_id': first.id, 'quantity': 1})
+        batch = [{'book_id': first.id, 'quantity': 2}, {'book_id': second.id, 'quantity': 1}, {'book_id': second.id, 'quantity': 1}]
+        response = self.client.post(f'{self.url}batch/', batch, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted((item['book_id'], item['quantity']) for item in response.data), [(first.id, 3), (second.id, 2)])
+        self.assertEqual(self.items(), [(first.id, 3), (second.id, 2)])
+
+    def test_checkout(self):
+        self.client.post(self.url, {'book_id': self.books[0].id, 'quantity': 2})
+        self.client.force_authenticate(User.objects.create_user(username='buyer', email='buyer@example.com'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/orders/', {'cart_id': self.cart_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['book']['id'], item['quantity']) for item in response.data['items']], [(self.books[0].id, 2)])
+        self.assertEqual(self.client.get(f'/carts/{self.cart_id}/').status_code, 404)
+        response = self.client.post('/orders/', {'cart_id': self.cart_id})
+        self.assertEqual(response.data['cart_id'], ['No cart with the given ID was found.'])
+
+
+@override_settings(STORE_CART_BACKEND='store.carts.CacheCartBackend', STORE_CART_TTL=60)
+class CacheCartTests(CartTests):
+    def test_carts_stay_out_of_the_database(self):
+        self.client.post(self.url, {'book_id': self.books[0].id, 'quantity': 1})
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_carts_expire_after_their_last_change(self):
+        now = time.time()
+        with mock.patch('time.time', return_value=now + 50):
+            self.client.post(self.url, {'book_id': self.books[0].id, 'quantity': 1})
+        with mock.patch('time.time', return_value=now + 100):
+            self.assertEqual(self.items(), [(self.books[0].id, 1)])
+        with mock.patch('time.time', return_value=now + 111):
+            self.assertEqual(self.client.get(f'/carts/{self.cart_id}/').status_code, 404)
+            self.assertEqual(self.client.post(self.url, {'book_id': self.books[0].id, 'quantity': 1}).status_code, 404)
+
+
+@override_settings(STORE_CART_BACKEND='store.carts.CacheCartBackend')
+class CacheCartQueryBudgetTests(QueryBudgetTests):
+    pass
+
+
+class PurgeCartsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Novels')
+        self.books = [
+            Book.objects.create(title=f'Book {index}', slug=f'book-{index}', category=category, unit_price=10, stock=5)
+            for index in range(2)
+        ]
+        self.old = [self.create_cart(days=40 + index) for index in range(5)]
+        self.recent = [self.create_cart(days=index) for index in range(2)]
+
+    def create_cart(self, days):
+        cart = Cart.objects.create()
+        Cart.objects.filter(pk=cart.pk).update(created_at=timezone.now() - timedelta(days=days))
+        CartItem.objects.bulk_create([CartItem(cart=cart, book=book, quantity=1) for book in self.books])
+        return cart.id
+
+    def purge(self, *args):
+        stdout = StringIO()
+        call_command('purge_carts', *args, stdout=stdout)
+        return stdout.getvalue().splitlines()
+
+    def test_only_expired_carts_and_their_items_are_deleted(self):
+        output = self.purge('--older-than', '30', '--batch-size', '2')
+        self.assertEqual([line.split(' (')[0] for line in output[:-1]], [
+            '2 carts, 4 items', '4 carts, 8 items', '5 carts, 10 items'
+        ])
+        self.assertTrue(output[-1].startswith('Deleted 5 carts and 10 cart items'))
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), set(self.recent))
+        self.assertEqual(set(CartItem.objects.values_list('cart_id', flat=True)), set(self.recent))
+        self.assertEqual(CartItem.objects.count(), 4)
+
+    def test_batches_go_oldest_first(self):
+        with mock.patch.object(CartItem.objects, 'filter', wraps=CartItem.objects.filter) as filter_items:
+            self.purge('--older-than', '30', '--batch-size', '3')
+        batches = [list(item.kwargs['cart_id__in']) for item in filter_items.call_args_list]
+        self.assertEqual(batches, [self.old[:1:-1], self.old[1::-1]])
+
+    def test_dry_run(self):
+        self.assertEqual(self.purge('--dry-run', '--older-than', '0.5')[0][:47], 'Would delete 6 carts and 12 cart items created ')
+        self.assertEqual(Cart.objects.count(), 7)
+
+    def test_invalid_options(self):
+        for args in (['--older-than', '-1'], ['--batch-size', '0']):
+            with self.assertRaises(CommandError):
+                self.purge(*args)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.category = Category.objects.create(name='Novels')
+        self.author = Author.objects.create(first_name='Humayun', last_name='Ahmed')
+        self.publication = Publication.objects.create(name='Anyaprokash')
+        self.book = self.create_books(1)[0]
+        self.client = APIClient()
+
+    def create_books(self, count):
+        return [
+            Book.objects.create(
+                title=f'Book {Book.objects.count()}', slug='book', category=self.category, author=self.author,
+                publication=self.publication, unit_price=10, stock=5
+            ) for _ in range(count)
+        ]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fields_prune(self):
+        detail = f'/books/{self.book.id}/'
+        self.assertEqual(self.get(detail, fields='id,title'), {'id': self.book.id, 'title': 'Book 0'})
+        self.assertEqual(self.get('/books/', fields='title, unit_price')['results'], [{'title': 'Book 0', 'unit_price': Decimal('10.00')}])
+        self.assertEqual(set(self.get(detail, fields='id,bogus')), {'id'})
+        self.assertGreater(len(self.get(detail, fields='')), 5)
+
+    def test_expand(self):
+        detail = f'/books/{self.book.id}/'
+        self.assertEqual(self.get(detail)['category'], self.category.id)
+        data = self.get(detail, expand='category,bogus')
+        self.assertEqual(data['category'], {'id': self.category.id, 'name': 'Novels', 'books_count': 1, 'in_stock_books_count': 1})
+        self.assertEqual(data['author'], self.author.id)
+        data = self.get('/books/', fields='id,author', expand='author,publication')['results'][0]
+        self.assertEqual(set(data), {'id', 'author'})
+        self.assertEqual(data['author']['last_name'], 'Ahmed')
+
+    def test_expanded_lists_keep_a_flat_query_count(self):
+        def count_queries():
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.get('/books/', expand='author,category,publication')
+            return len(queries)
+
+        one = count_queries()
+        self.create_books(9)
+        self.assertEqual(count_queries(), one)
+        self.assertEqual(len(self.get('/books/', expand='author')['results']), 10)
+
+    def test_expanded_orders_keep_a_flat_query_count(self):
+        staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_authenticate(staff)
+        buyers = [User.objects.create_user(username=f'buyer{index}', email=f'buyer{index}@example.com') for index in range(3)]
+        Order.objects.create(customer=buyers[0].customer)
+        with CaptureQueriesContext(connection) as one:
+            self.get('/orders/', expand='customer')
+        for buyer in buyers:
+            Order.objects.create(customer=buyer.customer)
+        with CaptureQueriesContext(connection) as many:
+            orders = self.get('/orders/', expand='customer')['results']
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(
+            sorted(order['customer']['user_id'] for order in orders),
+            sorted([buyers[0].id] + [buyer.id for buyer in buyers])
+        )
+
+
+class SeedScaleTests(TransactionTestCase):
+    # The command sets SQLite pragmas that cannot change inside a transaction.
+    def test_running_twice_appends(self):
+        options = {'users': 3, 'authors': 2, 'publications': 2, 'categories': 2, 'books': 6, 'reviews': 4, 'carts': 5, 'orders': 4}
+        for run in (1, 2):
+            call_command('seed_scale', seed=7, batch_size=2, stdout=mock.Mock(), **options)
+            self.assertEqual(Cart.objects.count(), 5 * run)
+            self.assertEqual(Book.objects.count(), 6 * run)
+            self.assertEqual(Order.objects.count(), 4 * run)
+            self.assertEqual(Customer.objects.count(), 3 * run)
+        self.assertEqual(Category.objects.aggregate(total=Sum('books_count'))['total'], 12)
+
+    def test_cart_ids_follow_the_seed(self):
+        options = {'users': 2, 'authors': 1, 'publications': 1, 'categories': 1, 'books': 3, 'reviews': 0, 'carts': 4, 'orders': 0}
+        call_command('seed_scale', seed=7, stdout=mock.Mock(), **options)
+        first_run = set(Cart.objects.values_list('id', flat=True))
+        Cart.objects.all().delete()
+        call_command('seed_scale', seed=7, stdout=mock.Mock(), **options)
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), first_run)
+        call_command('seed_scale', seed=8, stdout=mock.Mock(), **options)
+        self.assertEqual(Cart.objects.count(), 8)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    # Worker threads use their own connections, so the seeded rows must be committed.
+    def setUp(self):
+        get_cache().clear()
+        call_command(
+            'seed_scale', seed=3, users=4, authors=2, publications=2, categories=2, books=20, reviews=5,
+            carts=3, orders=5, stdout=mock.Mock()
+        )
+
+    def benchmark(self, *args):
+        stdout = StringIO()
+        # The test runner has already set up the test environment the command
+        # would install; one worker, since SQLite takes a single writer.
+        with mock.patch('store.management.commands.benchmark.setup_test_environment'), \
+                mock.patch('store.management.commands.benchmark.teardown_test_environment'):
+            call_command(
+                'benchmark', '--use-existing', '--requests', '40', '--warmup', '5', '--concurrency', '1', *args,
+                stdout=stdout
+            )
+        return stdout.getvalue()
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/run.json'
+            output = self.benchmark('--output', path)
+            with open(path) as file:
+                results = json.load(file)
+
+            self.assertEqual(set(results), {'meta', 'total', 'endpoints'})
+            self.assertEqual(results['meta']['concurrency'], 1)
+            self.assertEqual(results['total']['requests'], 35)
+            self.assertEqual(sum(endpoint['requests'] for endpoint in results['endpoints'].values()), 35)
+            for name, endpoint in results['endpoints'].items():
+                self.assertEqual(endpoint['errors'], 0, name)
+                self.assertLessEqual(endpoint['p50_ms'], endpoint['p95_ms'])
+                self.assertLessEqual(endpoint['p95_ms'], endpoint['p99_ms'])
+                self.assertIsNotNone(endpoint['queries_max'])
+            self.assertIn('total: 35 requests', output)
+
+            output = self.benchmark('--mix', 'checkout=1', '--compare', path, '--threshold', '1000000')
+            self.assertIn('checkout', output)
+            self.assertIn('No regressions', output)
+        self.assertGreaterEqual(Order.objects.count(), 5 + 35)
+
+    @override_settings(STORE_CART_BACKEND='store.carts.CacheCartBackend')
+    def test_cache_cart_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/run.json'
+            self.benchmark('--mix', 'cart_detail=1', '--output', path)
+            with open(path) as file:
+                cart_detail = json.load(file)['endpoints']['cart_detail']
+        self.assertEqual((cart_detail['requests'], cart_detail['status_codes']), (35, {'200': 35}))
+
+    def test_unknown_endpoint(self):
+        with self.assertRaises(CommandError):
+            self.benchmark('--mix', 'nothing=1')
@@ -13,6 +13,7 @@ router.register('books', views.BookViewSet, basename='books')
 router.register('customers', views.CustomerViewSet)
 router.register('orders', views.OrderViewSet, basename='orders')
 router.register('carts', views.CartViewSet)
+router.register('reports/sales', views.SalesReportViewSet, basename='sales-reports')
 
 books_router = routers.NestedDefaultRouter(router, 'books', lookup='book')
 books_router.register('reviews', views.ReviewViewSet, basename='book-reviews')
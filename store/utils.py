@@ -0,0 +1,9 @@
+def set_prefetched(instance, related_name, objects):
+    # Attach already-loaded related objects as if they came from prefetch_related().
+    queryset = getattr(instance, related_name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance._prefetched_objects_cache = {
+        **getattr(instance, '_prefetched_objects_cache', {}),
+        related_name: queryset,
+    }
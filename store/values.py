@@ -0,0 +1,86 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class ValuesSerializer:
+    # Read-only twin of a ModelSerializer that renders values() rows into the
+    # same representation, without a model instance or bound serializer per row.
+    # Built from a serializer instance, so ?fields= trimming carries over.
+    #   - model fields go through the original field's to_representation()
+    #   - primary key related fields are emitted as the raw key
+    #   - nested serializers on a foreign key read prefixed columns (book__title)
+    #   - nested many=True serializers on a reverse foreign key are loaded for
+    #     the whole page with one extra query
+    #   - anything else (SerializerMethodField) must be in computed_fields:
+    #     {name: (function(row), [columns it reads])}
+    computed_fields = {}
+
+    def __init__(self, serializer, prefix=''):
+        self.prefix = prefix
+        self.model = serializer.Meta.model
+        self.pk = prefix + self.model._meta.pk.attname
+        self.fields = []
+        self.columns = []
+        for name, field in serializer.fields.items():
+            if name in self.computed_fields:
+                function, columns = self.computed_fields[name]
+                self.fields.append((name, 'computed', function))
+                self.columns += [prefix + column for column in columns]
+            elif isinstance(field, serializers.ListSerializer) and not prefix:
+                relation = self.model._meta.get_field(field.source)
+                child = ValuesSerializer(field.child)
+                self.fields.append((name, 'many', (relation.field.attname, relation.related_model, child)))
+                self.columns.append(self.pk)
+            elif isinstance(field, serializers.Serializer):
+                nested = ValuesSerializer(field, prefix=f'{prefix}{field.source}__')
+                self.fields.append((name, 'nested', nested))
+                self.columns += nested.columns + [nested.pk]
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                self.fields.append((name, 'raw', prefix + field.source))
+                self.columns.append(prefix + field.source)
+            elif self.is_column(field.source):
+                self.fields.append((name, 'field', (prefix + field.source, field.to_representation)))
+                self.columns.append(prefix + field.source)
+            else:
+                raise TypeError(f'{type(self).__name__} cannot render {type(serializer).__name__}.{name}.')
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def is_column(self, source):
+        try:
+            return self.model._meta.get_field(source).concrete
+        except FieldDoesNotExist:
+            return False
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        related = {
+            name: self.load_many(rows, *arg)
+            for name, kind, arg in self.fields if kind == 'many'
+        }
+        return [self.to_row(row, related) for row in rows]
+
+    def load_many(self, rows, attname, model, child):
+        grouped = {row[self.pk]: [] for row in rows}
+        if grouped:
+            queryset = model.objects.filter(**{f'{attname}__in': grouped}).order_by('pk')
+            children = list(queryset.values(*dict.fromkeys(child.columns + [attname])))
+            for row, data in zip(children, child.to_representation(children)):
+                grouped[row[attname]].append(data)
+        return grouped
+
+    def to_row(self, row, related=None):
+        data = {}
+        for name, kind, arg in self.fields:
+            if kind == 'field':
+                column, to_representation = arg
+                value = row[column]
+                data[name] = None if value is None else to_representation(value)
+            elif kind == 'raw':
+                data[name] = row[arg]
+            elif kind == 'computed':
+                data[name] = arg(row)
+            elif kind == 'many':
+                data[name] = related[name][row[self.pk]]
+            else:
+                data[name] = None if row[arg.pk] is None else arg.to_row(row)
+        return data
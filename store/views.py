@@ -1,11 +1,15 @@
 from django.shortcuts import render
+from django.http import Http404
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models.aggregates import Count
+from rest_framework.filters import OrderingFilter
+from core.authentication import get_customer_id
 from store.permissions import IsAdminOrReadOnly
 from rest_framework.permissions import(
     IsAuthenticated,
@@ -30,13 +34,15 @@ from store.models import(
     Customer,
     Review,
     Cart,
-    CartItem
+    DailySales
 )
 from store.serializers import(
     CategorySerializer,
     AuthorSerializer,
     PublicationSerializer,
     BookSerializer,
+    BookValuesSerializer,
+    SimpleBookSerializer,
     CustomerSerializer,
     OrderSerializer,
     ReviewSerializer,
@@ -45,51 +51,111 @@ from store.serializers import(
     AddCartItemSerializer,
     UpdateCartItemSerializer,
     CreateOrderSerializer,
-    UpdateOrderSerializer
+    UpdateOrderSerializer,
+    SalesReportQuerySerializer
 )
-from store.filters import BookFilter
-from store.pagination import DefaultPagination
+from store.filters import BookFilter, BookSearchFilter
+from store.pagination import DefaultPagination, KeysetPagination
+from store.mixins import CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, ValuesListMixin
+from store.exports import EXPORT_FORMATS, stream_export
+from store.carts import get_cart_backend, parse_cart_id
+from store.values import ValuesSerializer
+from store.recommendations import get_recommendations
 
 
 # Create your views here.
 
-class CategoryViewSet(ModelViewSet):
-    queryset = Category.objects.annotate(books_count=Count('books')).all()
+BOOK_EXPORT_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'author_id': 'author_id',
+    'author_first_name': 'author__first_name',
+    'author_last_name': 'author__last_name',
+    'category_id': 'category_id',
+    'category': 'category__name',
+    'publication_id': 'publication_id',
+    'publication': 'publication__name',
+    'unit_price': 'unit_price',
+    'stock': 'stock',
+    'description': 'description',
+    'last_update': 'last_update',
+}
+
+ORDER_EXPORT_FIELDS = {
+    'order_id': 'order_id',
+    'placed_at': 'order__placed_at',
+    'payment_status': 'order__payment_status',
+    'customer_id': 'order__customer_id',
+    'item_id': 'id',
+    'book_id': 'book_id',
+    'book_title': 'book__title',
+    'quantity': 'quantity',
+    'unit_price': 'unit_price',
+}
+
+
+def export_response(request, queryset, fields, filename):
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return stream_export(queryset, fields, export_format, filename)
+
+
+# query_budget: the most queries each action may run, JWT user lookup included
+# (see core.middleware.QueryBudgetMiddleware).
+class CategoryViewSet(CachedResponseMixin, ValuesListMixin, ModelViewSet):
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
     pagination_class = DefaultPagination
     permission_classes = [IsAdminOrReadOnly]
+    cache_dependencies = [Category, Book]
+    values_serializer_class = ValuesSerializer
+    query_budget = {'list': 3, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 5}
 
     def destroy(self, request, *args, **kwargs):
-        if Book.objects.filter(category_id=kwargs['pk']).count() > 0 :
+        if self.get_object().books_count > 0 :
             return Response(
                 {'error': 'Category cannot be deleted because it includes one or more Books.'},
                 status=status.HTTP_405_METHOD_NOT_ALLOWED
             )
         return super().destroy(request, *args, **kwargs)
 
-class AuthorViewSet(ModelViewSet):
+class AuthorViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     pagination_class = DefaultPagination
     permission_classes = [IsAdminOrReadOnly]
+    cache_dependencies = [Author, Book]
+    query_budget = {'list': 3, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 4}
   
 
-class PublicationViewSet(ModelViewSet):
+class PublicationViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Publication.objects.all()
     serializer_class = PublicationSerializer
     pagination_class = DefaultPagination
     permission_classes = [IsAdminOrReadOnly]
+    cache_dependencies = [Publication, Book]
+    query_budget = {'list': 3, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 4}
    
 
-class BookViewSet(ModelViewSet):
+class BookViewSet(SparseFieldsMixin, ConditionalGetMixin, CachedResponseMixin, ValuesListMixin, ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    pagination_class = DefaultPagination
+    pagination_class = KeysetPagination
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    cache_dependencies = [Book, Author, Category, Publication]
+    values_serializer_class = BookValuesSerializer
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
     filterset_class = BookFilter
-    search_fields = ['title', 'description'] 
     ordering_fields = ['unit_price', 'last_update']
+    query_budget = {
+        'list': 3, 'retrieve': 3, 'create': 8, 'update': 9, 'partial_update': 9, 'destroy': 9, 'export': 2,
+        'recommendations': 2
+    }
 
 
     def get_serializer_context(self):
@@ -103,9 +169,36 @@ class BookViewSet(ModelViewSet):
             )
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(request, queryset, BOOK_EXPORT_FIELDS, 'books')
+
+    @action(detail=True, methods=['GET'])
+    def recommendations(self, request, pk=None):
+        # Neighbours come from the memory-mapped table built by
+        # `manage.py build_recommendations`; one query loads them with the book.
+        try:
+            book_id = int(pk)
+        except ValueError:
+            raise Http404
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValidationError({'limit': ['limit must be a positive integer.']})
+        ranked = get_recommendations(book_id, limit=int(limit))
+        books = Book.objects.only('id', 'title', 'unit_price').in_bulk([book_id, *(book for book, score in ranked)])
+        if book_id not in books:
+            raise Http404
+        return Response([
+            {**SimpleBookSerializer(books[book]).data, 'score': round(score, 4)}
+            for book, score in ranked if book in books
+        ])
+
 
 class ReviewViewSet(ModelViewSet):
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 3}
 
     def get_queryset(self):
         return Review.objects.filter(book_id=self.kwargs['book_pk'])
@@ -113,13 +206,28 @@ class ReviewViewSet(ModelViewSet):
     def get_serializer_context(self):
         return {'book_id':self.kwargs['book_pk']}
     
-class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+class CartViewSet(SparseFieldsMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
     queryset = Cart.objects.prefetch_related('items__book').all()
     serializer_class = CartSerializer
+    query_budget = {'create': 4, 'retrieve': 4, 'destroy': 7}
+
+    # Carts are read and written through the configured cart backend
+    # (STORE_CART_BACKEND), so the database and cache stores behave the same.
+    def get_object(self):
+        cart_id = parse_cart_id(self.kwargs['pk'])
+        cart = get_cart_backend().get_cart(cart_id) if cart_id else None
+        if cart is None:
+            raise Http404
+        self.check_object_permissions(self.request, cart)
+        return cart
+
+    def perform_destroy(self, instance):
+        get_cart_backend().delete_cart(instance.pk)
 
 
 class CartItemViewSet(ModelViewSet):
     serializer_class = CartItemSerializer
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 2, 'batch': 3, 'partial_update': 3, 'destroy': 3}
 
     # method name write in lowercase otherwise not work
     http_method_names = ['get', 'post', 'patch', 'delete']
@@ -131,11 +239,34 @@ class CartItemViewSet(ModelViewSet):
             return UpdateCartItemSerializer
         return CartItemSerializer
     
+    def get_cart_id(self):
+        cart_id = parse_cart_id(self.kwargs['cart_pk'])
+        if cart_id is None:
+            raise Http404
+        return cart_id
+
     def get_serializer_context(self):
-        return {'cart_id': self.kwargs['cart_pk']}
+        return {'cart_id': self.get_cart_id()}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('book')
+        return get_cart_backend().get_items(self.get_cart_id())
+
+    def get_object(self):
+        cart_item = get_cart_backend().get_item(self.get_cart_id(), self.kwargs['pk'])
+        if cart_item is None:
+            raise Http404
+        self.check_object_permissions(self.request, cart_item)
+        return cart_item
+
+    def perform_destroy(self, instance):
+        get_cart_backend().delete_item(instance)
+
+    @action(detail=False, methods=['POST'])
+    def batch(self, request, cart_pk=None):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
  
 
 
@@ -143,10 +274,13 @@ class CustomerViewSet(ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAdminUser]
+    query_budget = {
+        'list': 2, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 4, 'me': 3
+    }
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        customer = Customer.objects.get(user_id=request.user.id)
+        customer = Customer.objects.get(pk=get_customer_id(request))
         if request.method == 'GET':
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
@@ -157,18 +291,23 @@ class CustomerViewSet(ModelViewSet):
             return Response(serializer.data)
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(SparseFieldsMixin, ValuesListMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = KeysetPagination
+    values_serializer_class = ValuesSerializer
+    query_budget = {
+        'list': 4, 'retrieve': 5, 'create': 13, 'partial_update': 10, 'destroy': 10, 'export': 2
+    }
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return[IsAuthenticated()]
 
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(
             data=request.data,
-            context={'user_id':self.request.user.id}
+            context={'customer_id': get_customer_id(self.request)}
 
         )
         serializer.is_valid(raise_exception=True)
@@ -186,11 +325,71 @@ class OrderViewSet(ModelViewSet):
     def get_queryset(self):
         user = self.request.user
 
+        queryset = Order.objects.all()
+        fields = self.get_query_list(self.fields_query_param)
+        if not fields or 'items' in fields:
+            queryset = queryset.prefetch_related('items__book')
         if user.is_staff:
-            return Order.objects.all()
+            return queryset
         
-        customer_id = Customer.objects.only('id').get(user_id=user.id)
-        return Order.objects.filter(customer_id=customer_id)
+        return queryset.filter(customer_id=get_customer_id(self.request))
 
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        queryset = OrderItem.objects.filter(order__in=self.filter_queryset(self.get_queryset()))
+        return export_response(request, queryset, ORDER_EXPORT_FIELDS, 'orders')
 
 
+# Reports read only the DailySales rollup (store.sales), never the orders.
+class SalesReportViewSet(GenericViewSet):
+    queryset = DailySales.objects.all()
+    permission_classes = [IsAdminUser]
+    query_budget = {'top_sellers': 2, 'by_category': 2, 'by_publication': 2, 'timeseries': 2}
+    intervals = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        params = SalesReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        self.params = params.validated_data
+
+    def get_queryset(self):
+        queryset = DailySales.objects.filter(date__range=(self.params['start'], self.params['end']))
+        if 'category' in self.params:
+            queryset = queryset.filter(category_id=self.params['category'])
+        if 'publication' in self.params:
+            queryset = queryset.filter(publication_id=self.params['publication'])
+        return queryset.order_by()
+
+    def report(self, rows):
+        return Response({'start': self.params['start'], 'end': self.params['end'], 'results': list(rows)})
+
+    @action(detail=False, url_path='top-sellers')
+    def top_sellers(self, request):
+        # orders: completed orders containing the book
+        rows = self.get_queryset().values('book_id', title=F('book__title')).annotate(
+            units=Sum('units'), revenue=Sum('revenue'), orders=Sum('order_count')
+        ).order_by('-units', '-revenue', 'book_id')[:self.params['limit']]
+        return self.report(rows)
+
+    @action(detail=False, url_path='by-category')
+    def by_category(self, request):
+        rows = self.get_queryset().values('category_id', name=F('category__name')).annotate(
+            units=Sum('units'), revenue=Sum('revenue')
+        ).order_by('-revenue', 'category_id')
+        return self.report(rows)
+
+    @action(detail=False, url_path='by-publication')
+    def by_publication(self, request):
+        rows = self.get_queryset().values('publication_id', name=F('publication__name')).annotate(
+            units=Sum('units'), revenue=Sum('revenue')
+        ).order_by('-revenue', 'publication_id')
+        return self.report(rows)
+
+    @action(detail=False)
+    def timeseries(self, request):
+        trunc = self.intervals[self.params['interval']]
+        rows = self.get_queryset().values(period=trunc('date')).annotate(
+            units=Sum('units'), revenue=Sum('revenue')
+        ).order_by('period')
+        return self.report(rows)